@@ -3,14 +3,25 @@ import logging
 import asyncio
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 import telegram
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters
+from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, TypeHandler, ContextTypes, filters
 from dotenv import load_dotenv
-from telegram.request import HTTPXRequest
-import pandas as pd
 import re
 import string
 import shutil
 import csv
+import json
+from kontak import (
+    clean_phone_numbers, build_vcf, build_vcf_groups, read_phone_numbers, add_contacts_to_vcf,
+    extract_vcf_to_txt, delete_numbers_from_file, count_contacts, rename_contacts_in_file, merge_files,
+    read_contacts, write_contacts,
+    remove_duplicates_vcf, remove_duplicates_txt, remove_duplicates_xlsx, rapih_txt_file,
+    count_contacts_fast, split_byte_ranges, remove_duplicates_global, plan_text_split, write_split_part,
+    plan_xlsx_split, iter_xlsx_parts,
+)
+from pekerja import run_cpu, run_io, start_pools, shutdown_pools, get_cpu_worker_count
+from kirim import send_output, send_outputs, build_requests
+from pembatas import build_rate_limiter, build_update_processor, backoff_delay, call_with_flood_wait
+from riwayat import filter_known_numbers, remove_duplicates_with_history, record_history, clear_history
 
 # Fungsi untuk memastikan direktori data ada
 def ensure_data_directory():
@@ -73,7 +84,8 @@ AUTHORIZED_PASSWORD = os.getenv('AUTHORIZED_PASSWORD')
 active_users = set()
 
 # Inisialisasi Semaphore untuk membatasi jumlah tugas yang berjalan bersamaan
-semaphore = asyncio.Semaphore(50)
+# Tugas berat dijalankan di pool pekerja (pekerja.py), jadi nilai ini membatasi paralelisme sebenarnya
+semaphore = asyncio.Semaphore(int(os.getenv('MAX_CONCURRENT_TASKS', '50')))
 
 # Fungsi untuk mendapatkan identitas pengguna
 def get_user_identity(update: Update) -> str:
@@ -83,15 +95,6 @@ def get_user_identity(update: Update) -> str:
 def remove_emoji(text):
     return re.sub(r'[^\w\s]', '', text)
 
-# Fungsi untuk membersihkan nomor telepon
-def clean_phone_number(number):
-    number = re.sub(r'\D', '', number)  # Hapus semua karakter non-numerik
-    if len(number) >= 8:
-        if not number.startswith('+'):
-            number = '+' + number
-        return number
-    return None
-
 def clean_filename(filename):
     return re.sub(r'[\\/:*?"<>|]', '_', filename)
 
@@ -140,13 +143,15 @@ async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 "/manual - Konversi secara manual\n"
                 "/tambah - Tambahkan kontak ke .vcf\n"
                 "/hapus - Hapus kontak dari file\n"
-                "/gabung - Gabungkan file\n"
+                "/gabung - Gabungkan file (/gabung unik untuk sekaligus hapus duplikat)\n"
                 "/pecah - Pecah file\n"
                 "/rename_ctc - Ganti nama kontak\n"
                 "/rename_file - Ganti nama file\n"
                 "/jumlah - Hitung jumlah kontak\n"
-                "/hapus_duplikat - Hapus kontak duplikat\n"
-                "/rapih - Rapihkan nomor\n\n"
+                "/hapus_duplikat - Hapus kontak duplikat (/hapus_duplikat global untuk antar file)\n"
+                "/rapih - Rapihkan nomor (/rapih jumlah untuk menyertakan jumlah kemunculan)\n"
+                "/zip - Kirim hasil dalam satu file .zip\n"
+                "/riwayat - Lewati nomor yang sudah pernah diproses\n\n"
                 "<b>Dibuat oleh @Karin383</b>"
             ),
             parse_mode='HTML'
@@ -168,16 +173,23 @@ async def retry_operation(operation, max_retries=10, delay=6):
                 logger.error(f"Operation failed after {max_retries} attempts.")
                 raise
 
-# Fungsi untuk mengirim pesan dengan mekanisme retry
-async def send_message_with_retry(context, chat_id, text, retries=10, delay=6):
+# Fungsi untuk mengirim pesan dengan mekanisme retry.
+# Laju pengiriman dan RetryAfter diatur oleh pembatas di Application, atau oleh call_with_flood_wait jika
+# pembatas dimatikan (lihat pembatas.py); di sini hanya timeout yang diulang dengan exponential backoff plus jitter.
+async def send_message_with_retry(context, chat_id, text, retries=10, base_delay=1, max_delay=30):
     for attempt in range(retries):
         try:
-            await asyncio.wait_for(context.bot.send_message(chat_id=chat_id, text=text), timeout=60)
+            await call_with_flood_wait(context.application.bot, lambda: asyncio.wait_for(context.bot.send_message(chat_id=chat_id, text=text), timeout=60))
             logger.info(f"Message sent to {chat_id} on attempt {attempt + 1}")
             return
+        except telegram.error.RetryAfter:
+            # Sudah ditunggu dan diulang oleh pembatas laju atau call_with_flood_wait; jangan ulangi lagi di sini
+            logger.error(f"Failed to send message to {chat_id}: flood limit.")
+            return
         except (telegram.error.TimedOut, asyncio.TimeoutError):
             if attempt < retries - 1:
-                logger.warning(f"Retrying to send message to {chat_id}. Attempt {attempt + 1} of {retries}.")
+                delay = backoff_delay(attempt, base_delay, max_delay)
+                logger.warning(f"Retrying to send message to {chat_id} in {delay:.1f} seconds. Attempt {attempt + 1} of {retries}.")
                 await asyncio.sleep(delay)
             else:
                 logger.error(f"Failed to send message to {chat_id} after {retries} attempts.")
@@ -187,6 +199,83 @@ async def send_message_with_retry(context, chat_id, text, retries=10, delay=6):
             logger.error(f"Error in send_message_with_retry: {e}")
             await context.bot.send_message(chat_id=chat_id, text="server sedang sibuk, harap tunggu")
             logger.error("Error in send_message_with_retry")
+            await asyncio.sleep(backoff_delay(attempt, base_delay, max_delay))
+
+# Fungsi untuk memisahkan akhiran 'zip' dari input jumlah, misalnya "50 zip"
+def parse_zip_suffix(text):
+    text = text.strip()
+    if text.lower().endswith('zip'):
+        return text[:-3].strip(), True
+    return text, False
+
+# Fungsi untuk membaca cara memecah file dari input pengguna:
+# "10" (10 bagian), "500 kontak" (500 kontak per bagian), atau "20 mb" / "500 kb" (ukuran maksimal per bagian).
+# Mengembalikan dict argumen untuk split_file, ValueError jika input tidak valid.
+def parse_split_input(text):
+    parts = text.lower().split()
+    if not parts or len(parts) > 2:
+        raise ValueError(text)
+    value = int(parts[0])
+    if value <= 0:
+        raise ValueError(text)
+    if len(parts) == 1:
+        return {'split_count': value}
+    if parts[1] == 'kontak':
+        return {'per_part': value}
+    if parts[1] in ('kb', 'mb'):
+        return {'max_bytes': value * (1024 if parts[1] == 'kb' else 1024 * 1024)}
+    raise ValueError(text)
+
+# Fungsi untuk membaca pengaturan milik satu pengguna. Pengaturan disimpan di bot_data per user id, karena
+# user_data dikosongkan setiap perintah baru dan chat_data dipakai bersama oleh semua anggota grup.
+def get_user_setting(context, user_id, name, default=False):
+    return context.bot_data.get('user_settings', {}).get(user_id, {}).get(name, default)
+
+# Fungsi untuk menyimpan pengaturan milik satu pengguna (lihat get_user_setting)
+def set_user_setting(context, user_id, name, value):
+    context.bot_data.setdefault('user_settings', {}).setdefault(user_id, {})[name] = value
+
+# Fungsi untuk menentukan nama arsip jika hasil perlu dibundel dalam ZIP, None jika dikirim per file.
+# ZIP dipakai jika mode /zip aktif, pengguna menambahkan 'zip' pada input, atau jumlah bagian melewati ZIP_AUTO_THRESHOLD.
+def get_zip_name(update, context, base_name, part_count):
+    try:
+        threshold = int(os.getenv('ZIP_AUTO_THRESHOLD', '0'))
+    except ValueError:
+        threshold = 0
+    if get_user_setting(context, update.effective_user.id, 'zip_mode') or context.user_data.get('zip') or (threshold and part_count > threshold):
+        return f"{base_name}.zip"
+    return None
+
+# Fungsi untuk menangani perintah /zip (mode ZIP per pengguna, tetap aktif antar perintah)
+async def zip_mode(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_identity = get_user_identity(update)
+    logger.info(f"User {user_identity} issued /zip command.")
+    enabled = not get_user_setting(context, update.effective_user.id, 'zip_mode')
+    set_user_setting(context, update.effective_user.id, 'zip_mode', enabled)
+    if enabled:
+        response = "Mode ZIP aktif. Hasil dengan banyak file dikirim dalam satu file .zip"
+    else:
+        response = "Mode ZIP nonaktif."
+    await send_message_with_retry(context, update.message.chat_id, response)
+    logger.info(f"Bot response: {response}")
+
+# Fungsi untuk menangani perintah /riwayat: mengaktifkan atau menonaktifkan pemakaian riwayat nomor.
+# Saat aktif, /convert dan /hapus_duplikat melewati nomor yang sudah pernah diproses. "/riwayat hapus" mengosongkan riwayat.
+async def riwayat(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_identity = get_user_identity(update)
+    logger.info(f"User {user_identity} issued /riwayat command.")
+    if context.args and context.args[0].lower() == 'hapus':
+        await run_io(clear_history, update.effective_user.id)
+        response = "Riwayat nomor telah dihapus."
+    else:
+        enabled = not get_user_setting(context, update.effective_user.id, 'history')
+        set_user_setting(context, update.effective_user.id, 'history', enabled)
+        if enabled:
+            response = "Riwayat aktif. Nomor yang sudah pernah diproses akan dilewati di /convert dan /hapus_duplikat."
+        else:
+            response = "Riwayat nonaktif."
+    await send_message_with_retry(context, update.message.chat_id, response)
+    logger.info(f"Bot response: {response}")
 
 # Fungsi untuk memulai bot
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -446,7 +535,8 @@ async def handle_new_file_name(update: Update, context: ContextTypes.DEFAULT_TYP
                 await send_message_with_retry(context, update.message.chat_id, "server sedang sibuk, harap tunggu")
         else:
             for file_path in file_paths:
-                await update.message.reply_document(document=open(file_path, 'rb'))
+                with open(file_path, 'rb') as renamed_file:
+                    await update.message.reply_document(document=renamed_file)
                 logger.info(f"Sent renamed file: {file_path}")
                 if os.path.exists(file_path):
                     os.remove(file_path)
@@ -501,11 +591,14 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
             invalid_format = True
             error_message = "Format tidak didukung. Unggah file .vcf."
         elif context.user_data.get('in_gabung'):
-            if 'file_extension' not in context.user_data:
+            if file_extension not in ['.txt', '.xlsx', '.vcf']:
+                invalid_format = True
+                error_message = "Format tidak didukung. Unggah file .txt, .xlsx, atau .vcf."
+            elif 'file_extension' not in context.user_data:
                 context.user_data['file_extension'] = file_extension
             elif context.user_data['file_extension'] != file_extension:
-                invalid_format = True
-                error_message = "Kirim file dengan format yang sama."
+                # Format campuran digabung lewat rekaman kontak bersama, format hasil ditanyakan setelah nama file
+                context.user_data['mixed_formats'] = True
         elif context.user_data.get('in_pecah') and file_extension not in ['.txt', '.xlsx', '.vcf']:
             invalid_format = True
             error_message = "Format tidak didukung. Unggah file .txt, .xlsx, atau .vcf."
@@ -540,11 +633,16 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
 
         try:
             file = await asyncio.wait_for(document.get_file(), timeout=60)
+            # Nama file dipesan dengan membuat file kosong secara eksklusif, karena pengguna lain bisa
+            # mengunggah file bernama sama pada saat yang sama
             file_path = os.path.join('cache', file_name)
-            if os.path.exists(file_path):
-                base_name, ext = os.path.splitext(file_name)
-                counter = 1
-                while os.path.exists(file_path):
+            base_name, ext = os.path.splitext(file_name)
+            counter = 1
+            while True:
+                try:
+                    open(file_path, 'x').close()
+                    break
+                except FileExistsError:
                     file_path = os.path.join('cache', f"{base_name}_{counter}{ext}")
                     counter += 1
             await asyncio.wait_for(file.download_to_drive(file_path), timeout=60)
@@ -638,7 +736,12 @@ async def done(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     elif context.user_data.get('in_gabung'):
         await done_gabung(update, context)
     elif context.user_data.get('in_pecah'):
-        await send_message_with_retry(context, update.message.chat_id, "Masukkan jumlah bagian:")
+        await send_message_with_retry(
+            context, update.message.chat_id,
+            "Masukkan jumlah bagian (misalnya 10), jumlah kontak per bagian (misalnya 500 kontak), "
+            "atau ukuran maksimal per bagian (misalnya 20 mb):\n"
+            "(tambahkan 'zip' untuk menerima satu file .zip, misalnya 10 zip)"
+        )
         context.user_data['awaiting_split_count'] = True
         logger.info("Bot response: Masukkan jumlah bagian:")
     elif context.user_data.get('in_hapus_duplikat'):
@@ -727,12 +830,13 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
             file_name = clean_filename(update.message.text)
             context.user_data['file_name'] = file_name
             context.user_data['awaiting_file_name'] = False
-            await send_message_with_retry(context, update.message.chat_id, "Jumlah kontak per file atau 'semua':")
+            await send_message_with_retry(context, update.message.chat_id, "Jumlah kontak per file atau 'semua':\n(tambahkan 'zip' untuk menerima satu file .zip, misalnya 100 zip)")
             context.user_data['awaiting_split_choice'] = True
             logger.info(f"User {user_identity} provided file name: {file_name}")
             logger.info("Bot response: Jumlah kontak per file atau 'semua':")
         elif context.user_data.get('awaiting_split_choice'):
-            split_choice = update.message.text
+            split_choice, use_zip = parse_zip_suffix(update.message.text)
+            context.user_data['zip'] = use_zip
             if split_choice.lower() == 'semua':
                 context.user_data['split_choice'] = 'semua'
             else:
@@ -747,7 +851,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
             logger.info(f"User {user_identity} provided split choice: {split_choice}")
     elif context.user_data.get('in_admin'):
         if 'awaiting_admin_numbers' not in context.user_data:
-            admin_numbers = [clean_phone_number(line.strip()) for line in update.message.text.split('\n') if clean_phone_number(line.strip())]
+            admin_numbers = clean_phone_numbers(update.message.text.split('\n'))
             context.user_data['admin_numbers'] = admin_numbers
             context.user_data['awaiting_admin_numbers'] = False
             await send_message_with_retry(context, update.message.chat_id, "Masukkan nama admin:")
@@ -761,7 +865,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
             context.user_data['awaiting_navy_numbers'] = True
             logger.info(f"User {user_identity} provided admin name: {admin_name}")
         elif context.user_data.get('awaiting_navy_numbers'):
-            navy_numbers = [clean_phone_number(line.strip()) for line in update.message.text.split('\n') if clean_phone_number(line.strip())]
+            navy_numbers = clean_phone_numbers(update.message.text.split('\n'))
             context.user_data['navy_numbers'] = navy_numbers
             context.user_data['awaiting_navy_numbers'] = False
             await send_message_with_retry(context, update.message.chat_id, "Masukkan nama navy:")
@@ -782,7 +886,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
             logger.info(f"User {user_identity} provided file name: {file_name}")
     elif context.user_data.get('in_manual'):
         if 'awaiting_manual_numbers' not in context.user_data:
-            manual_numbers = [clean_phone_number(line.strip()) for line in update.message.text.split('\n') if clean_phone_number(line.strip())]
+            manual_numbers = clean_phone_numbers(update.message.text.split('\n'))
             context.user_data['manual_numbers'] = manual_numbers
             context.user_data['awaiting_manual_numbers'] = False
             await send_message_with_retry(context, update.message.chat_id, "Masukkan nama kontak:")
@@ -844,18 +948,35 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
             file_name = clean_filename(update.message.text)
             context.user_data['file_name'] = file_name
             context.user_data['awaiting_file_name'] = False
-            await gabung_files(update, context)
             logger.info(f"User {user_identity} provided file name: {file_name}")
+            if context.user_data.get('mixed_formats'):
+                await send_message_with_retry(context, update.message.chat_id, "File berbeda format. Pilih format hasil: txt, vcf, atau xlsx")
+                context.user_data['awaiting_merge_format'] = True
+                logger.info("Bot response: Pilih format hasil: txt, vcf, atau xlsx")
+            else:
+                await gabung_files(update, context)
+        elif context.user_data.get('awaiting_merge_format'):
+            merge_format = '.' + update.message.text.strip().lower().lstrip('.')
+            if merge_format not in ['.txt', '.vcf', '.xlsx']:
+                await send_message_with_retry(context, update.message.chat_id, "Format tidak valid. Pilih txt, vcf, atau xlsx")
+                logger.info(f"User {user_identity} provided invalid merge format: {update.message.text}")
+                return
+            context.user_data['merge_format'] = merge_format
+            context.user_data['awaiting_merge_format'] = False
+            logger.info(f"User {user_identity} provided merge format: {merge_format}")
+            await gabung_files(update, context)
     elif context.user_data.get('in_pecah'):
         if context.user_data.get('awaiting_split_count'):
             try:
-                split_count = int(update.message.text.strip())
-                context.user_data['split_count'] = split_count
+                split_text, use_zip = parse_zip_suffix(update.message.text)
+                split_options = parse_split_input(split_text)
+                context.user_data['split_options'] = split_options
+                context.user_data['zip'] = use_zip
                 context.user_data['awaiting_split_count'] = False
                 await pecah_files(update, context)
-                logger.info(f"User {user_identity} provided split count: {split_count}")
+                logger.info(f"User {user_identity} provided split option: {split_text}")
             except ValueError:
-                await send_message_with_retry(context, update.message.chat_id, "Input tidak valid. Masukkan jumlah bagian yang valid.")
+                await send_message_with_retry(context, update.message.chat_id, "Input tidak valid. Contoh: 10, 500 kontak, atau 20 mb.")
                 logger.info(f"User {user_identity} provided invalid split count: {update.message.text}")
     else:
         logger.info("Bot response: Tidak ada alur yang aktif.")
@@ -887,23 +1008,25 @@ async def _convert_contacts(update: Update, context: ContextTypes.DEFAULT_TYPE)
     files_to_process = file_paths[:20]
     files_failed = file_paths[20:]
 
+    # Baca semua file secara paralel di pool proses
+    all_phone_numbers = await asyncio.gather(*(run_cpu(read_phone_numbers, file_path) for file_path in files_to_process))
+
+    # Jika riwayat aktif, lewati nomor yang sudah pernah diproses pengguna ini
+    history_keys = None
+    if get_user_setting(context, update.effective_user.id, 'history'):
+        all_phone_numbers, skipped, history_keys = await run_cpu(filter_known_numbers, update.effective_user.id, all_phone_numbers)
+
     tasks = []
-    for index, file_path in enumerate(files_to_process):
-        if file_path.endswith('.txt'):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    phone_numbers = [clean_phone_number(line.strip()) for line in file.readlines() if clean_phone_number(line.strip())]
-            except UnicodeDecodeError:
-                with open(file_path, 'r', encoding='latin-1') as file:
-                    phone_numbers = [clean_phone_number(line.strip()) for line in file.readlines() if clean_phone_number(line.strip())]
-        elif file_path.endswith('.xlsx'):
-            df = pd.read_excel(file_path)
-            phone_numbers = [clean_phone_number(str(number)) for number in df.iloc[:, 0].astype(str).tolist() if clean_phone_number(str(number))]
-        else:
+    for index, phone_numbers in enumerate(all_phone_numbers):
+        if phone_numbers is None:
             await send_message_with_retry(context, update.message.chat_id, "Format tidak didukung.")
             logger.info("Bot response: Format tidak didukung.")
             return
 
+        # File tanpa nomor tersisa (misalnya semua sudah ada di riwayat) dilewati, Telegram menolak file .vcf kosong
+        if len(phone_numbers) == 0:
+            continue
+
         if split_choice == 'semua':
             tasks.append(create_vcf_from_all_contacts(update, context, phone_numbers, base_contact_name, base_file_name, last_number, index, multiple_files))
         else:
@@ -911,8 +1034,17 @@ async def _convert_contacts(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     await asyncio.gather(*tasks)
 
-    await send_message_with_retry(context, update.message.chat_id, "File .vcf telah dikirim")
-    logger.info(f"All VCF files sent to user {get_user_identity(update)}.")
+    # Riwayat baru dicatat setelah semua file terkirim, agar pengulangan karena timeout tidak membuang nomor
+    if history_keys is not None:
+        await run_io(record_history, update.effective_user.id, history_keys)
+        await send_message_with_retry(context, update.message.chat_id, f"{skipped} nomor dilewati karena sudah pernah diproses.")
+
+    if tasks:
+        await send_message_with_retry(context, update.message.chat_id, "File .vcf telah dikirim")
+        logger.info(f"All VCF files sent to user {get_user_identity(update)}.")
+    else:
+        await send_message_with_retry(context, update.message.chat_id, "Tidak ada nomor baru, file .vcf tidak dibuat.")
+        logger.info("Bot response: Tidak ada nomor baru, file .vcf tidak dibuat.")
 
     # Hapus file yang diproses
     for file_path in files_to_process:
@@ -951,31 +1083,10 @@ async def _convert_admin_navy(update: Update, context: ContextTypes.DEFAULT_TYPE
     navy_name = context.user_data['navy_name']
     file_name = context.user_data['file_name_admin']
 
-    vcf_content = ""
-    contact_counter = 1
-
-    # Tambahkan kontak admin
-    for number in admin_numbers:
-        vcf_content += f"BEGIN:VCARD\nVERSION:3.0\nFN:{admin_name} {contact_counter}\nTEL:{number}\nEND:VCARD\n"
-        contact_counter += 1
-
-    # Reset counter untuk kontak navy
-    contact_counter = 1
-
-    # Tambahkan kontak navy
-    for number in navy_numbers:
-        vcf_content += f"BEGIN:VCARD\nVERSION:3.0\nFN:{navy_name} {contact_counter}\nTEL:{number}\nEND:VCARD\n"
-        contact_counter += 1
-
-    vcf_path = f"cache/{file_name}.vcf"
-    with open(vcf_path, 'w', encoding='utf-8') as vcf_file:
-        vcf_file.write(vcf_content)
-    await update.message.reply_document(document=open(vcf_path, 'rb'))
-    logger.info(f"Sent VCF file: {vcf_path}")
+    # Tambahkan kontak admin lalu kontak navy, counter dimulai lagi dari 1 untuk navy
+    output = await run_cpu(build_vcf_groups, f"{file_name}.vcf", [(admin_numbers, admin_name), (navy_numbers, navy_name)])
+    await send_output(update, output)
     await send_message_with_retry(context, update.message.chat_id, "File .vcf telah dikirim")
-    if os.path.exists(vcf_path):
-        os.remove(vcf_path)
-        logger.info(f"Deleted generated VCF file: {vcf_path}")
 
     # Hapus file yang diproses jika ada
     if 'file_paths' in context.user_data:
@@ -1003,23 +1114,10 @@ async def _convert_manual(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     manual_contact_name = context.user_data['manual_contact_name']
     manual_file_name = context.user_data['manual_file_name']
 
-    vcf_content = ""
-    contact_counter = 1
-
     # Tambahkan kontak manual
-    for number in manual_numbers:
-        vcf_content += f"BEGIN:VCARD\nVERSION:3.0\nFN:{manual_contact_name} {contact_counter}\nTEL:{number}\nEND:VCARD\n"
-        contact_counter += 1
-
-    vcf_path = f"cache/{manual_file_name}.vcf"
-    with open(vcf_path, 'w', encoding='utf-8') as vcf_file:
-        vcf_file.write(vcf_content)
-    await update.message.reply_document(document=open(vcf_path, 'rb'))
-    logger.info(f"Sent VCF file: {vcf_path}")
+    output = await run_cpu(build_vcf, f"{manual_file_name}.vcf", manual_numbers, manual_contact_name)
+    await send_output(update, output)
     await send_message_with_retry(context, update.message.chat_id, "File .vcf telah dikirim")
-    if os.path.exists(vcf_path):
-        os.remove(vcf_path)
-        logger.info(f"Deleted generated VCF file: {vcf_path}")
 
     # Hapus file yang diproses jika ada
     if 'file_paths' in context.user_data:
@@ -1052,24 +1150,9 @@ async def _convert_vcf_extract(update: Update, context: ContextTypes.DEFAULT_TYP
     tasks = []
     for file_path in files_to_process:
         if file_path.endswith('.vcf'):
-            txt_content = ""
-            with open(file_path, 'r', encoding='utf-8') as vcf_file:
-                for line in vcf_file:
-                    # Bersihkan baris dari tanda baca, spasi, huruf, dan tanda +
-                    cleaned_line = re.sub(r'[^\d]', '', line)
-                    # Cari nomor telepon di dalam setiap baris yang telah dibersihkan
-                    numbers = re.findall(r'\b\d{8,15}\b', cleaned_line)
-                    for number in numbers:
-                        txt_content += number + "\n"
-            txt_path = file_path.replace('.vcf', '.txt')
-            if txt_content.strip():  # Periksa apakah konten tidak kosong
-                with open(txt_path, 'w', encoding='utf-8') as txt_file:
-                    txt_file.write(txt_content)
-                await update.message.reply_document(document=open(txt_path, 'rb'))
-                logger.info(f"Sent TXT file: {txt_path}")
-                if os.path.exists(txt_path):
-                    os.remove(txt_path)
-                    logger.info(f"Deleted generated TXT file: {txt_path}")
+            output = await run_cpu(extract_vcf_to_txt, file_path, os.path.basename(file_path).replace('.vcf', '.txt'))
+            if output is not None:  # Periksa apakah konten tidak kosong
+                await send_output(update, output)
             else:
                 files_failed.append(file_path)
                 logger.info(f"File {file_path} is empty after conversion.")
@@ -1121,25 +1204,8 @@ async def _add_contacts_convert(update: Update, context: ContextTypes.DEFAULT_TY
     tasks = []
     for file_path in files_to_process:
         if file_path.endswith('.vcf'):
-            vcf_content = ""
-            contact_counter = 1
-            with open(file_path, 'r', encoding='utf-8') as vcf_file:
-                vcf_content = vcf_file.read()
-            new_vcf_content = ""
-            for contact in new_contacts:
-                contact = clean_phone_number(contact.strip())
-                if contact:
-                    new_vcf_content += f"BEGIN:VCARD\nVERSION:3.0\nFN:{new_contact_name} {contact_counter}\nTEL:{contact}\nEND:VCARD\n"
-                    contact_counter += 1
-            new_vcf_content += vcf_content
-            vcf_path = file_path
-            with open(vcf_path, 'w', encoding='utf-8') as vcf_file:
-                vcf_file.write(new_vcf_content)
-            await update.message.reply_document(document=open(vcf_path, 'rb'))
-            logger.info(f"Sent updated VCF file: {vcf_path}")
-            if os.path.exists(vcf_path):
-                os.remove(vcf_path)
-                logger.info(f"Deleted generated VCF file: {vcf_path}")
+            output = await run_io(add_contacts_to_vcf, file_path, new_contacts, new_contact_name)
+            await send_output(update, output)
         else:
             files_failed.append(file_path)
 
@@ -1186,27 +1252,9 @@ async def _delete_contacts_from_file(update: Update, context: ContextTypes.DEFAU
 
     tasks = []
     for file_path in files_to_process:
-        if file_path.endswith('.txt'):
-            with open(file_path, 'r') as file:
-                lines = file.readlines()
-            new_lines = [line for line in lines if not any(delete_number in line.strip() for delete_number in delete_numbers)]
-            with open(file_path, 'w') as file:
-                file.writelines(new_lines)
-            await update.message.reply_document(document=open(file_path, 'rb'))
-            logger.info(f"Sent updated TXT file: {file_path}")
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"Deleted generated TXT file: {file_path}")
-        elif file_path.endswith('.xlsx'):
-            df = pd.read_excel(file_path)
-            for delete_number in delete_numbers:
-                df = df[~df.iloc[:, 0].astype(str).str.contains(delete_number)]
-            df.to_excel(file_path, index=False)
-            await update.message.reply_document(document=open(file_path, 'rb'))
-            logger.info(f"Sent updated XLSX file: {file_path}")
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"Deleted generated XLSX file: {file_path}")
+        if file_path.endswith('.txt') or file_path.endswith('.xlsx'):
+            output = await run_cpu(delete_numbers_from_file, file_path, delete_numbers)
+            await send_output(update, output)
         else:
             files_failed.append(file_path)
 
@@ -1244,6 +1292,17 @@ async def hitung_jumlah_kontak(update: Update, context: ContextTypes.DEFAULT_TYP
             await send_message_with_retry(context, update.message.chat_id, "server error silahkan coba lagi")
             logger.error(f"Error in hitung_jumlah_kontak: {e}")
 
+# Fungsi untuk menghitung kontak satu file. File .txt/.vcf yang lebih besar dari COUNT_PARALLEL_MIN_SIZE
+# (default 64 MB) dibagi per rentang byte dan dihitung di beberapa proses sekaligus.
+async def count_file_contacts(file_path):
+    if os.path.getsize(file_path) >= int(os.getenv('COUNT_PARALLEL_MIN_SIZE', str(64 * 1024 * 1024))):
+        ranges = await run_io(split_byte_ranges, file_path, get_cpu_worker_count())
+        if len(ranges) > 1:
+            counts = await asyncio.gather(*(run_cpu(count_contacts_fast, file_path, start, end) for start, end in ranges))
+            if None not in counts:
+                return sum(counts)
+    return await run_cpu(count_contacts, file_path)
+
 async def _hitung_jumlah_kontak(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     file_paths = context.user_data['file_paths']
 
@@ -1253,39 +1312,13 @@ async def _hitung_jumlah_kontak(update: Update, context: ContextTypes.DEFAULT_TY
 
     jumlah_kontak = {}
 
-    for file_path in files_to_process:
-        if file_path.endswith('.vcf'):
-            count = 0
-            with open(file_path, 'r', encoding='utf-8') as vcf_file:
-                for line in vcf_file:
-                    # Bersihkan baris dari tanda baca, spasi, huruf, dan tanda +
-                    cleaned_line = re.sub(r'[^\d]', '', line)
-                    # Cari nomor telepon di dalam setiap baris yang telah dibersihkan
-                    numbers = re.findall(r'\b\d{8,15}\b', cleaned_line)
-                    count += len(numbers)
-            jumlah_kontak[file_path] = count
-        elif file_path.endswith('.txt'):
-            count = 0
-            with open(file_path, 'r', encoding='utf-8') as txt_file:
-                for line in txt_file:
-                    # Bersihkan baris dari tanda baca, spasi, huruf, dan tanda +
-                    cleaned_line = re.sub(r'[^\d]', '', line)
-                    # Cari nomor telepon di dalam setiap baris yang telah dibersihkan
-                    numbers = re.findall(r'\b\d{8,15}\b', cleaned_line)
-                    count += len(numbers)
-            jumlah_kontak[file_path] = count
-        elif file_path.endswith('.xlsx'):
-            count = 0
-            df = pd.read_excel(file_path)
-            for number in df.iloc[:, 0].astype(str).tolist():
-                # Bersihkan nomor dari tanda baca, spasi, huruf, dan tanda +
-                cleaned_number = re.sub(r'[^\d]', '', number)
-                # Cari nomor telepon di dalam setiap nomor yang telah dibersihkan
-                numbers = re.findall(r'\b\d{8,15}\b', cleaned_number)
-                count += len(numbers)
-            jumlah_kontak[file_path] = count
-        else:
+    # Hitung semua file secara paralel di pool proses
+    counts = await asyncio.gather(*(count_file_contacts(file_path) for file_path in files_to_process))
+    for file_path, count in zip(files_to_process, counts):
+        if count is None:
             files_failed.append(file_path)
+        else:
+            jumlah_kontak[file_path] = count
 
     if jumlah_kontak:
         result_message = "Jumlah kontak file:\n" + "\n".join([f"{os.path.basename(file)}: {count}" for file, count in jumlah_kontak.items()])
@@ -1335,20 +1368,15 @@ async def _rename_contacts_in_vcf(update: Update, context: ContextTypes.DEFAULT_
     files_to_process = file_paths[:20]
     files_failed = file_paths[20:]
 
-    for file_path in files_to_process:
-        if file_path.endswith('.vcf'):
-            with open(file_path, 'r', encoding='utf-8') as vcf_file:
-                vcf_content = vcf_file.read()
-            new_vcf_content = vcf_content.replace(old_name, new_name)
-            with open(file_path, 'w', encoding='utf-8') as vcf_file:
-                vcf_file.write(new_vcf_content)
-            await update.message.reply_document(document=open(file_path, 'rb'))
-            logger.info(f"Sent updated VCF file: {file_path}")
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"Deleted generated VCF file: {file_path}")
-        else:
-            files_failed.append(file_path)
+    # File diproses satu per satu sambil file sebelumnya diunggah
+    async def produce_renamed():
+        for file_path in files_to_process:
+            if file_path.endswith('.vcf'):
+                yield await run_io(rename_contacts_in_file, file_path, old_name, new_name)
+            else:
+                files_failed.append(file_path)
+
+    await send_outputs(update, produce_renamed(), zip_name=get_zip_name(update, context, new_name, len(files_to_process)))
 
     await send_message_with_retry(context, update.message.chat_id, "File .vcf telah dikirim")
     logger.info(f"All updated VCF files sent to user {get_user_identity(update)}.")
@@ -1388,6 +1416,8 @@ async def gabung(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                 logger.info(f"Deleted user uploaded file: {file_path}")
     context.user_data.clear()
     context.user_data['in_gabung'] = True
+    # "/gabung unik" membuang nomor duplikat selama penggabungan
+    context.user_data['merge_dedup'] = bool(context.args) and context.args[0].lower() == 'unik'
     await send_message_with_retry(context, update.message.chat_id, "Kirim file .vcf .txt atau .xlsx\nMaksimal 20 file:")
     logger.info("Bot response: Kirim file .vcf .txt atau .xlsx\nMaksimal 20 file:")
 
@@ -1412,40 +1442,32 @@ async def _gabung_files(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     files_to_process = file_paths[:20]
     files_failed = file_paths[20:]
 
-    if file_extension == '.vcf':
-        combined_content = ""
-        for file_path in files_to_process:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                combined_content += file.read()
-        combined_path = f"cache/{file_name}.vcf"
-        with open(combined_path, 'w', encoding='utf-8') as combined_file:
-            combined_file.write(combined_content)
-    elif file_extension == '.txt':
-        combined_content = ""
-        for file_path in files_to_process:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                combined_content += file.read()
-        combined_path = f"cache/{file_name}.txt"
-        with open(combined_path, 'w', encoding='utf-8') as combined_file:
-            combined_file.write(combined_content)
+    dedup = context.user_data.get('merge_dedup', False)
+    count_label = "baris"
+    if context.user_data.get('mixed_formats'):
+        # Format berbeda: baca semua file menjadi Contact secara paralel, lalu tulis dalam format yang dipilih
+        file_extension = context.user_data['merge_format']
+        contact_lists = await asyncio.gather(*(run_cpu(read_contacts, file_path) for file_path in files_to_process))
+        count_label = "kontak"
+        output, row_count, duplicates = await run_cpu(write_contacts, contact_lists, file_extension, f"{file_name}{file_extension}", file_name, dedup)
+    elif file_extension in ['.vcf', '.txt']:
+        # Tanpa dedup file hanya disalin per blok byte, cukup di pool thread; dedup perlu decode di pool proses
+        run = run_cpu if dedup else run_io
+        output, duplicates, row_count = await run(merge_files, files_to_process, file_extension, f"{file_name}{file_extension}", dedup)
     elif file_extension == '.xlsx':
-        combined_df = pd.DataFrame()
-        for file_path in files_to_process:
-            df = pd.read_excel(file_path)
-            combined_df = pd.concat([combined_df, df], ignore_index=True)
-        combined_path = f"cache/{file_name}.xlsx"
-        combined_df.to_excel(combined_path, index=False)
+        output, duplicates, row_count = await run_cpu(merge_files, files_to_process, file_extension, f"{file_name}.xlsx", dedup)
     else:
         await send_message_with_retry(context, update.message.chat_id, "Format file tidak didukung.")
         logger.info("Bot response: Format file tidak didukung.")
         return
 
-    await update.message.reply_document(document=open(combined_path, 'rb'))
-    logger.info(f"Sent combined file: {combined_path}")
-    await send_message_with_retry(context, update.message.chat_id, f"File {file_extension} telah dikirim")
-    if os.path.exists(combined_path):
-        os.remove(combined_path)
-        logger.info(f"Deleted combined file: {combined_path}")
+    await send_output(update, output)
+    message = f"File {file_extension} telah dikirim"
+    if row_count is not None:
+        message += f"\n{row_count} {count_label}"
+    if dedup:
+        message += f"\n{duplicates} duplikat dihapus"
+    await send_message_with_retry(context, update.message.chat_id, message)
 
     # Hapus file yang diproses
     for file_path in files_to_process:
@@ -1497,7 +1519,7 @@ async def pecah_files(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
 
 async def _pecah_files(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     file_paths = context.user_data['file_paths']
-    split_count = context.user_data['split_count']
+    split_options = context.user_data['split_options']
 
     # Batasi jumlah file yang diproses hingga 20
     files_to_process = file_paths[:20]
@@ -1505,12 +1527,8 @@ async def _pecah_files(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
     for file_path in files_to_process:
         base_name, ext = os.path.splitext(os.path.basename(file_path))
-        if ext == '.vcf':
-            await pecah_vcf(update, context, file_path, base_name, split_count)
-        elif ext == '.txt':
-            await pecah_txt(update, context, file_path, base_name, split_count)
-        elif ext == '.xlsx':
-            await pecah_xlsx(update, context, file_path, base_name, split_count)
+        if ext in ['.vcf', '.txt', '.xlsx']:
+            await pecah_file(update, context, file_path, base_name, split_options)
         else:
             files_failed.append(file_path)
 
@@ -1530,76 +1548,43 @@ async def _pecah_files(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
     context.user_data.clear()
 
-async def pecah_vcf(update: Update, context: ContextTypes.DEFAULT_TYPE, file_path, base_name, split_count):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as vcf_file:
-            lines = vcf_file.readlines()
-        contacts = [line for line in lines if line.startswith("BEGIN:VCARD")]
-        total_contacts = len(contacts)
-        contacts_per_file = total_contacts // split_count
-        remainder = total_contacts % split_count
-
-        for i in range(split_count):
-            start_index = i * contacts_per_file
-            end_index = start_index + contacts_per_file + (1 if i < remainder else 0)
-            part_contacts = lines[start_index:end_index]
-            part_path = f"cache/{base_name}_{i+1}.vcf"
-            with open(part_path, 'w', encoding='utf-8') as part_file:
-                part_file.writelines(part_contacts)
-            await update.message.reply_document(document=open(part_path, 'rb'))
-            logger.info(f"Sent VCF part file: {part_path}")
-            if os.path.exists(part_path):
-                os.remove(part_path)
-                logger.info(f"Deleted generated VCF part file: {part_path}")
-    except asyncio.TimeoutError:
-        logger.error("Timeout error in pecah_vcf")
-        await send_message_with_retry(context, update.message.chat_id, "server sedang sibuk, harap tunggu")
-
-async def pecah_txt(update: Update, context: ContextTypes.DEFAULT_TYPE, file_path, base_name, split_count):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as txt_file:
-            lines = txt_file.readlines()
-        total_lines = len(lines)
-        lines_per_file = total_lines // split_count
-        remainder = total_lines % split_count
-
-        for i in range(split_count):
-            start_index = i * lines_per_file
-            end_index = start_index + lines_per_file + (1 if i < remainder else 0)
-            part_lines = lines[start_index:end_index]
-            part_path = f"cache/{base_name}_{i+1}.txt"
-            with open(part_path, 'w', encoding='utf-8') as part_file:
-                part_file.writelines(part_lines)
-            await update.message.reply_document(document=open(part_path, 'rb'))
-            logger.info(f"Sent TXT part file: {part_path}")
-            if os.path.exists(part_path):
-                os.remove(part_path)
-                logger.info(f"Deleted generated TXT part file: {part_path}")
-    except asyncio.TimeoutError:
-        logger.error("Timeout error in pecah_txt")
-        await send_message_with_retry(context, update.message.chat_id, "server sedang sibuk, harap tunggu")
-
-async def pecah_xlsx(update: Update, context: ContextTypes.DEFAULT_TYPE, file_path, base_name, split_count):
+# Fungsi untuk memecah file .vcf, .txt, atau .xlsx dan mengirim setiap bagian.
+# split_options berisi salah satu dari split_count, per_part, atau max_bytes (lihat parse_split_input).
+async def pecah_file(update: Update, context: ContextTypes.DEFAULT_TYPE, file_path, base_name, split_options):
+    source_path = None
     try:
-        df = pd.read_excel(file_path)
-        total_rows = len(df)
-        rows_per_file = total_rows // split_count
-        remainder = total_rows % split_count
-
-        for i in range(split_count):
-            start_index = i * rows_per_file
-            end_index = start_index + rows_per_file + (1 if i < remainder else 0)
-            part_df = df.iloc[start_index:end_index]
-            part_path = f"cache/{base_name}_{i+1}.xlsx"
-            part_df.to_excel(part_path, index=False)
-            await update.message.reply_document(document=open(part_path, 'rb'))
-            logger.info(f"Sent XLSX part file: {part_path}")
-            if os.path.exists(part_path):
-                os.remove(part_path)
-                logger.info(f"Deleted generated XLSX part file: {part_path}")
+        if file_path.endswith('.xlsx'):
+            # Baris .xlsx hanya bisa dibaca berurutan, jadi satu generator di pool thread membuat bagian
+            # satu per satu; bagian berikutnya ditulis selagi bagian sebelumnya diunggah
+            sizes = await run_cpu(plan_xlsx_split, file_path, **split_options)
+            part_count = len(sizes)
+            xlsx_parts = iter_xlsx_parts(file_path, base_name, sizes)
+
+            async def produce_parts():
+                for _ in range(part_count):
+                    yield await run_io(next, xlsx_parts)
+
+            parts = produce_parts()
+        else:
+            # Pool proses hanya mencari batas bagian; isi setiap bagian disalin saat dibutuhkan,
+            # sambil bagian sebelumnya diunggah, jadi file besar tidak pernah dimuat utuh ke memori
+            source_path, ranges = await run_cpu(plan_text_split, file_path, **split_options)
+            part_count = len(ranges)
+            ext = os.path.splitext(file_path)[1]
+
+            async def produce_parts():
+                for part_index, (start, end) in enumerate(ranges, start=1):
+                    yield await run_io(write_split_part, source_path, f"{base_name}_{part_index}{ext}", start, end)
+
+            parts = produce_parts()
+        await send_outputs(update, parts, zip_name=get_zip_name(update, context, base_name, part_count))
     except asyncio.TimeoutError:
-        logger.error("Timeout error in pecah_xlsx")
+        logger.error("Timeout error in pecah_file")
         await send_message_with_retry(context, update.message.chat_id, "server sedang sibuk, harap tunggu")
+    finally:
+        # Salinan UTF-8 sementara dari plan_text_split
+        if source_path is not None and source_path != file_path and os.path.exists(source_path):
+            os.remove(source_path)
 
 # Fungsi untuk menangani perintah /hapus_duplikat
 async def hapus_duplikat(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -1618,6 +1603,8 @@ async def hapus_duplikat(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 logger.info(f"Deleted user uploaded file: {file_path}")
     context.user_data.clear()
     context.user_data['in_hapus_duplikat'] = True
+    # "/hapus_duplikat global" juga membuang nomor yang sudah muncul di file yang dikirim sebelumnya
+    context.user_data['dedup_global'] = bool(context.args) and context.args[0].lower() == 'global'
     await send_message_with_retry(context, update.message.chat_id, "Kirim file .vcf, .txt, atau .xlsx\nMaksimal 20 file:")
     logger.info("Bot response: Kirim file .vcf, .txt, atau .xlsx\nMaksimal 20 file:")
 
@@ -1641,25 +1628,61 @@ async def _hapus_duplikat_files(update: Update, context: ContextTypes.DEFAULT_TY
     files_failed = file_paths[20:]
 
     tasks = []
+    task_paths = []
+    global_paths = []
+    use_history = get_user_setting(context, update.effective_user.id, 'history')
     for file_path in files_to_process:
-        if file_path.endswith('.vcf'):
-            tasks.append(hapus_duplikat_vcf(update, context, file_path))
+        if (context.user_data.get('dedup_global') or use_history) and os.path.splitext(file_path)[1] in ['.vcf', '.txt', '.xlsx']:
+            global_paths.append(file_path)
+        elif file_path.endswith('.vcf'):
+            tasks.append(hapus_duplikat_vcf(file_path))
+            task_paths.append(file_path)
         elif file_path.endswith('.txt'):
-            tasks.append(hapus_duplikat_txt(update, context, file_path))
+            tasks.append(hapus_duplikat_txt(file_path))
+            task_paths.append(file_path)
         elif file_path.endswith('.xlsx'):
-            tasks.append(hapus_duplikat_xlsx(update, context, file_path))
+            tasks.append(hapus_duplikat_xlsx(file_path))
+            task_paths.append(file_path)
         else:
             files_failed.append(file_path)
 
-    results = await asyncio.gather(*tasks)
-
-    if any(results):
-        await send_message_with_retry(context, update.message.chat_id, "Nomor duplikat telah di hapus")
-        logger.info(f"All files sent to user {get_user_identity(update)}.")
+    history_keys = None
+    if use_history and global_paths:
+        # Riwayat aktif: nomor yang sudah pernah diproses juga dihitung sebagai duplikat
+        results, history_keys = await run_cpu(remove_duplicates_with_history, update.effective_user.id, global_paths, context.user_data.get('dedup_global', False))
+    elif global_paths:
+        # Mode global: file diproses berurutan dengan satu indeks nomor bersama
+        results = await run_cpu(remove_duplicates_global, global_paths)
+    else:
+        # Semua file diproses paralel, lalu hasilnya dikirim bersama (maksimal 10 per send_media_group)
+        results = await asyncio.gather(*tasks)
+
+    # Ringkasan dibuat sebelum dikirim karena buffer ditutup setelah terkirim.
+    # File yang semua nomornya sudah ada sebelumnya tidak punya buffer, tetapi tetap disebut di ringkasan.
+    outputs = []
+    summary = []
+    for file_path, (output, duplicates) in zip(global_paths or task_paths, results):
+        if output is not None:
+            outputs.append(output)
+            summary.append(f"{output.filename}: {duplicates} duplikat")
+        elif duplicates:
+            summary.append(f"{os.path.basename(file_path)}: {duplicates} duplikat, semua nomor sudah ada sebelumnya (file tidak dikirim)")
+
+    if summary:
+        if outputs:
+            await send_outputs(update, outputs, zip_name=get_zip_name(update, context, "hapus_duplikat", len(outputs)))
+        summary = "\n".join(summary)
+        await send_message_with_retry(context, update.message.chat_id, f"Nomor duplikat telah di hapus\n{summary}")
+        logger.info(f"{len(outputs)} files sent to user {get_user_identity(update)}.")
     else:
         await send_message_with_retry(context, update.message.chat_id, "Tidak ada nomor duplikat ditemukan.")
         logger.info("No duplicates found in any files.")
 
+    # Nomor yang diproses dicatat ke riwayat baik ada duplikat maupun tidak; jika pengiriman gagal,
+    # exception di atas membatalkan pencatatan sehingga file yang sama bisa diproses ulang
+    if history_keys is not None:
+        await run_io(record_history, update.effective_user.id, history_keys)
+
     # Hapus file yang diproses
     for file_path in files_to_process:
         if os.path.exists(file_path):
@@ -1678,87 +1701,38 @@ async def _hapus_duplikat_files(update: Update, context: ContextTypes.DEFAULT_TY
 
     context.user_data.clear()
 
-# Fungsi untuk menghapus nomor duplikat dari file .vcf
-async def hapus_duplikat_vcf(update: Update, context: ContextTypes.DEFAULT_TYPE, file_path: str) -> bool:
+# Fungsi untuk menghapus nomor duplikat dari file .vcf, mengembalikan (buffer hasil atau None, jumlah duplikat)
+async def hapus_duplikat_vcf(file_path: str):
     try:
-        with open(file_path, 'r', encoding='utf-8') as vcf_file:
-            lines = vcf_file.readlines()
-        contacts = {}
-        current_contact = []
-        for line in lines:
-            if line.startswith("BEGIN:VCARD"):
-                current_contact = [line]
-            elif line.startswith("END:VCARD"):
-                current_contact.append(line)
-                contact_str = ''.join(current_contact)
-                tel_lines = [l for l in current_contact if l.startswith("TEL:")]
-                for tel_line in tel_lines:
-                    number = clean_phone_number(tel_line)
-                    if number not in contacts:
-                        contacts[number] = contact_str
-                current_contact = []
-            else:
-                current_contact.append(line)
-
-        if len(contacts) == len(lines) // 5:  # Approximate check for no duplicates
+        output, duplicates = await run_cpu(remove_duplicates_vcf, file_path)
+        if output is None:
             logger.info(f"No duplicates found in {file_path}.")
-            return False
-
-        new_vcf_content = ''.join(contacts.values())
-        with open(file_path, 'w', encoding='utf-8') as vcf_file:
-            vcf_file.write(new_vcf_content)
-        await update.message.reply_document(document=open(file_path, 'rb'))
-        logger.info(f"Sent updated VCF file: {file_path}")
-        return True
+        return output, duplicates
     except Exception as e:
         logger.error(f"Error processing VCF file {file_path}: {e}")
-        return False
+        return None, 0
 
-# Fungsi untuk menghapus nomor duplikat dari file .txt
-async def hapus_duplikat_txt(update: Update, context: ContextTypes.DEFAULT_TYPE, file_path: str) -> bool:
+# Fungsi untuk menghapus nomor duplikat dari file .txt, mengembalikan (buffer hasil atau None, jumlah duplikat)
+async def hapus_duplikat_txt(file_path: str):
     try:
-        with open(file_path, 'r', encoding='utf-8') as txt_file:
-            lines = txt_file.readlines()
-        numbers = set()
-        new_lines = []
-        for line in lines:
-            number = clean_phone_number(line)
-            if number not in numbers:
-                numbers.add(number)
-                new_lines.append(line)
-
-        if len(numbers) == len(lines):
+        output, duplicates = await run_cpu(remove_duplicates_txt, file_path)
+        if output is None:
             logger.info(f"No duplicates found in {file_path}.")
-            return False
-
-        with open(file_path, 'w', encoding='utf-8') as txt_file:
-            txt_file.writelines(new_lines)
-        await update.message.reply_document(document=open(file_path, 'rb'))
-        logger.info(f"Sent updated TXT file: {file_path}")
-        return True
+        return output, duplicates
     except Exception as e:
         logger.error(f"Error processing TXT file {file_path}: {e}")
-        return False
+        return None, 0
 
-# Fungsi untuk menghapus nomor duplikat dari file .xlsx
-async def hapus_duplikat_xlsx(update: Update, context: ContextTypes.DEFAULT_TYPE, file_path: str) -> bool:
+# Fungsi untuk menghapus nomor duplikat dari file .xlsx, mengembalikan (buffer hasil atau None, jumlah duplikat)
+async def hapus_duplikat_xlsx(file_path: str):
     try:
-        df = pd.read_excel(file_path)
-        original_length = len(df)
-        df.drop_duplicates(subset=df.columns[0], keep='first', inplace=True)
-        new_length = len(df)
-
-        if original_length == new_length:
+        output, duplicates = await run_cpu(remove_duplicates_xlsx, file_path)
+        if output is None:
             logger.info(f"No duplicates found in {file_path}.")
-            return False
-
-        df.to_excel(file_path, index=False)
-        await update.message.reply_document(document=open(file_path, 'rb'))
-        logger.info(f"Sent updated XLSX file: {file_path}")
-        return True
+        return output, duplicates
     except Exception as e:
         logger.error(f"Error processing XLSX file {file_path}: {e}")
-        return False
+        return None, 0
 
 
 # Fungsi untuk menangani perintah /rapih
@@ -1778,6 +1752,8 @@ async def rapih(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                 logger.info(f"Deleted user uploaded file: {file_path}")
     context.user_data.clear()
     context.user_data['in_rapih'] = True
+    # "/rapih jumlah" menulis setiap nomor sekali beserta jumlah kemunculannya
+    context.user_data['rapih_with_counts'] = bool(context.args) and context.args[0].lower() == 'jumlah'
     await send_message_with_retry(context, update.message.chat_id, "Kirim file .txt\nMaksimal 20 file:")
     logger.info("Bot response: Kirim file .txt\nMaksimal 20 file:")
 
@@ -1803,19 +1779,8 @@ async def _rapih_files(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     for file_path in files_to_process:
         if file_path.endswith('.txt'):
             try:
-                with open(file_path, 'r', encoding='utf-8') as txt_file:
-                    lines = txt_file.readlines()
-                numbers = [clean_phone_number(line.strip()) for line in lines if clean_phone_number(line.strip())]
-                number_counts = {number: numbers.count(number) for number in set(numbers)}
-                sorted_numbers = sorted(numbers, key=lambda x: (-number_counts[x], x))
-                sorted_content = "\n".join(sorted_numbers)
-                with open(file_path, 'w', encoding='utf-8') as txt_file:
-                    txt_file.write(sorted_content)
-                await update.message.reply_document(document=open(file_path, 'rb'))
-                logger.info(f"Sent sorted TXT file: {file_path}")
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Deleted generated TXT file: {file_path}")
+                output = await run_cpu(rapih_txt_file, file_path, context.user_data.get('rapih_with_counts', False))
+                await send_output(update, output)
             except Exception as e:
                 logger.error(f"Error processing TXT file {file_path}: {e}")
                 files_failed.append(file_path)
@@ -1845,53 +1810,72 @@ async def _rapih_files(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
 # Fungsi untuk membuat file VCF dari semua kontak
 async def create_vcf_from_all_contacts(update: Update, context: ContextTypes.DEFAULT_TYPE, phone_numbers, base_contact_name, base_file_name, last_number, index, multiple_files):
-    vcf_content = ""
-    contact_counter = 1
     contact_name = clean_contact_name(f"{base_contact_name} {string.ascii_uppercase[index]}" if multiple_files else base_contact_name)
     base_file_name = clean_filename(base_file_name)
-    vcf_path = f"cache/{base_file_name}{last_number + index}.vcf" if multiple_files else f"cache/{base_file_name}.vcf"
-    for i, number in enumerate(phone_numbers, start=1):
-        vcf_content += f"BEGIN:VCARD\nVERSION:3.0\nFN:{contact_name} {contact_counter}\nTEL:{number}\nEND:VCARD\n"
-        contact_counter += 1
-    with open(vcf_path, 'w', encoding='utf-8') as vcf_file:
-        vcf_file.write(vcf_content)
-    await update.message.reply_document(document=open(vcf_path, 'rb'))
-    logger.info(f"Sent VCF file: {vcf_path}")
-    if os.path.exists(vcf_path):
-        os.remove(vcf_path)
-        logger.info(f"Deleted generated VCF file: {vcf_path}")
+    vcf_name = f"{base_file_name}{last_number + index}.vcf" if multiple_files else f"{base_file_name}.vcf"
+    output = await run_cpu(build_vcf, vcf_name, phone_numbers, contact_name)
+    await send_output(update, output)
 
 # Fungsi untuk membuat file VCF dari batch kontak
 async def create_vcf_from_batches(update: Update, context: ContextTypes.DEFAULT_TYPE, phone_numbers, base_contact_name, base_file_name, batch_size, last_number, index, multiple_files):
-    batches = [phone_numbers[i:i + batch_size] for i in range(0, len(phone_numbers), batch_size)]
-    contact_counter = 1
     contact_name = clean_contact_name(f"{base_contact_name} {string.ascii_uppercase[index]}" if multiple_files else base_contact_name)
     base_file_name = clean_filename(base_file_name)
-    for batch_index, batch in enumerate(batches, start=1):
-        vcf_content = ""
-        if multiple_files:
-            vcf_path = f"cache/{base_file_name}{last_number + index}_{batch_index}.vcf"
-            contact_name = f"{base_contact_name} {string.ascii_uppercase[index]}"
-        else:
-            vcf_path = f"cache/{base_file_name}{last_number + batch_index - 1}.vcf"
-        for i, number in enumerate(batch, start=1):
-            vcf_content += f"BEGIN:VCARD\nVERSION:3.0\nFN:{contact_name} {contact_counter}\nTEL:{number}\nEND:VCARD\n"
-            contact_counter += 1
-        with open(vcf_path, 'w', encoding='utf-8') as vcf_file:
-            vcf_file.write(vcf_content)
-        await update.message.reply_document(document=open(vcf_path, 'rb'))
-        logger.info(f"Sent VCF file: {vcf_path}")
-        if os.path.exists(vcf_path):
-            os.remove(vcf_path)
-            logger.info(f"Deleted generated VCF file: {vcf_path}")
+    if multiple_files:
+        contact_name = f"{base_contact_name} {string.ascii_uppercase[index]}"
+
+    # Setiap batch dibuat di pool proses sambil batch sebelumnya diunggah
+    async def produce_batches():
+        for batch_index, start in enumerate(range(0, len(phone_numbers), batch_size), start=1):
+            batch = phone_numbers[start:start + batch_size]
+            if multiple_files:
+                vcf_name = f"{base_file_name}{last_number + index}_{batch_index}.vcf"
+            else:
+                vcf_name = f"{base_file_name}{last_number + batch_index - 1}.vcf"
+            # Nomor urut kontak berlanjut antar batch
+            yield await run_cpu(build_vcf, vcf_name, batch, contact_name, start + 1)
+
+    part_count = -(-len(phone_numbers) // batch_size)
+    zip_name = get_zip_name(update, context, f"{base_file_name}{last_number + index}" if multiple_files else base_file_name, part_count)
+    await send_outputs(update, produce_batches(), zip_name=zip_name)
 
 # Fungsi untuk mengekstrak angka terakhir dari nama file, jika ada
 def extract_number_from_filename(filename):
     match = re.search(r'(\d+)(?!.*\d)', filename)
     return int(match.group(0)) if match else None
 
+# Fungsi untuk merekam update mentah ke file JSONL (RECORD_UPDATES) agar bisa diputar ulang dengan replay_updates.py
+async def record_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    with open(os.getenv('RECORD_UPDATES'), 'a', encoding='utf-8') as record_file:
+        record_file.write(json.dumps(update.to_dict(), ensure_ascii=False) + "\n")
+
+# Fungsi untuk membuat pool pekerja saat bot mulai
+async def post_init(application) -> None:
+    start_pools()
+
+# Fungsi untuk menutup pool pekerja saat bot berhenti
+async def post_shutdown(application) -> None:
+    shutdown_pools()
+
 # Inisialisasi bot
-application = ApplicationBuilder().token(TELEGRAM_BOT_API_TOKEN).request(HTTPXRequest()).build()
+# Pool koneksi untuk pesan, file, dan get_updates dipisah (lihat kirim.build_requests)
+# Semua panggilan ke chat melewati pembatas laju global dan per chat (lihat pembatas.py)
+# Update dari pengguna berbeda diproses bersamaan, update dari satu pengguna berurutan (lihat PerUserUpdateProcessor)
+bot_request, get_updates_request = build_requests()
+application = (
+    ApplicationBuilder()
+    .token(TELEGRAM_BOT_API_TOKEN)
+    .request(bot_request)
+    .get_updates_request(get_updates_request)
+    .rate_limiter(build_rate_limiter())
+    .concurrent_updates(build_update_processor())
+    .post_init(post_init)
+    .post_shutdown(post_shutdown)
+    .build()
+)
+
+# Rekam semua update jika RECORD_UPDATES diisi
+if os.getenv('RECORD_UPDATES'):
+    application.add_handler(TypeHandler(Update, record_update), group=-1)
 
 # Menambahkan handler
 application.add_handler(CommandHandler("start", start))
@@ -1911,8 +1895,27 @@ application.add_handler(CommandHandler("gabung", gabung))
 application.add_handler(CommandHandler("pecah", pecah))
 application.add_handler(CommandHandler("hapus_duplikat", hapus_duplikat))
 application.add_handler(CommandHandler("rapih", rapih))
+application.add_handler(CommandHandler("zip", zip_mode))
+application.add_handler(CommandHandler("riwayat", riwayat))
 application.add_handler(MessageHandler(filters.Document.ALL, handle_file))
 application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
 
-# Menjalankan bot
-application.run_polling()
\ No newline at end of file
+# Menjalankan bot (dijaga agar pool proses tidak menjalankan bot lagi saat mengimpor modul ini)
+# Jika WEBHOOK_URL diisi, bot memakai webhook dengan server HTTP bawaan python-telegram-bot[webhooks];
+# jika tidak, bot memakai polling seperti biasa.
+if __name__ == '__main__':
+    webhook_url = os.getenv('WEBHOOK_URL')
+    if webhook_url:
+        url_path = os.getenv('WEBHOOK_PATH', 'telegram')
+        secret_token = os.getenv('WEBHOOK_SECRET_TOKEN')
+        if not secret_token:
+            logger.warning("WEBHOOK_SECRET_TOKEN kosong, update webhook tidak divalidasi.")
+        application.run_webhook(
+            listen=os.getenv('WEBHOOK_LISTEN', '0.0.0.0'),
+            port=int(os.getenv('WEBHOOK_PORT', '8443')),
+            url_path=url_path,
+            webhook_url=f"{webhook_url.rstrip('/')}/{url_path}",
+            secret_token=secret_token,
+        )
+    else:
+        application.run_polling()
\ No newline at end of file
@@ -3,7 +3,7 @@ import logging
 import asyncio
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 import telegram
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters
+from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, TypeHandler, ContextTypes, filters
 from dotenv import load_dotenv
 from telegram.request import HTTPXRequest
 import pandas as pd
@@ -11,6 +11,7 @@ import re
 import string
 import shutil
 import csv
+import json
 
 # Function to ensure the data directory exists
 def ensure_data_directory():
@@ -1832,8 +1833,22 @@ def extract_number_from_filename(filename):
     match = re.search(r'(\d+)(?!.*\d)', filename)
     return int(match.group(0)) if match else None
 
+# Function to record raw updates to a JSONL file (RECORD_UPDATES) so they can be replayed with replay_updates.py
+async def record_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    with open(os.getenv('RECORD_UPDATES'), 'a', encoding='utf-8') as record_file:
+        record_file.write(json.dumps(update.to_dict(), ensure_ascii=False) + "\n")
+
 # Initialize the bot
-application = ApplicationBuilder().token(TELEGRAM_BOT_API_TOKEN).request(HTTPXRequest()).build()
+application = (
+    ApplicationBuilder()
+    .token(TELEGRAM_BOT_API_TOKEN)
+    .request(HTTPXRequest())
+    .build()
+)
+
+# Record all updates if RECORD_UPDATES is set
+if os.getenv('RECORD_UPDATES'):
+    application.add_handler(TypeHandler(Update, record_update), group=-1)
 
 # Add handlers
 application.add_handler(CommandHandler("start", start))
@@ -1857,4 +1872,21 @@ application.add_handler(MessageHandler(filters.Document.ALL, handle_file))
 application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
 
 # Run the bot
-application.run_polling()
\ No newline at end of file
+# If WEBHOOK_URL is set, the bot uses a webhook served by python-telegram-bot[webhooks]'s built-in HTTP server;
+# otherwise it uses polling as before.
+if __name__ == '__main__':
+    webhook_url = os.getenv('WEBHOOK_URL')
+    if webhook_url:
+        url_path = os.getenv('WEBHOOK_PATH', 'telegram')
+        secret_token = os.getenv('WEBHOOK_SECRET_TOKEN')
+        if not secret_token:
+            logger.warning("WEBHOOK_SECRET_TOKEN is empty, webhook updates are not validated.")
+        application.run_webhook(
+            listen=os.getenv('WEBHOOK_LISTEN', '0.0.0.0'),
+            port=int(os.getenv('WEBHOOK_PORT', '8443')),
+            url_path=url_path,
+            webhook_url=f"{webhook_url.rstrip('/')}/{url_path}",
+            secret_token=secret_token,
+        )
+    else:
+        application.run_polling()
\ No newline at end of file
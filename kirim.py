@@ -0,0 +1,235 @@
+import os
+import asyncio
+import logging
+import shutil
+import zipfile
+import telegram
+from telegram.request import BaseRequest, HTTPXRequest
+from kontak import OutputBuffer
+from pekerja import run_io
+from pembatas import call_with_flood_wait
+
+# Modul ini berisi fungsi untuk mengirim file hasil ke pengguna.
+# Konfigurasi lewat .env:
+#   UPLOAD_PREFETCH     - jumlah kelompok bagian yang boleh disiapkan lebih dulu selagi bagian sebelumnya diunggah (default 3)
+#   MEDIA_GROUP         - kirim banyak file sekaligus lewat send_media_group, '0' untuk mematikan (default 1)
+#   HTTP_VERSION        - versi HTTP ke API Telegram, '1.1' atau '2' (butuh httpx[http2]) (default 1.1)
+#   MESSAGE_POOL_SIZE   - jumlah koneksi untuk pesan dan panggilan API kecil (default 64)
+#   MESSAGE_TIMEOUT     - timeout baca/tulis (detik) untuk pesan kecil (default 10)
+#   FILE_POOL_SIZE      - jumlah koneksi untuk unggah dan unduh file (default 16)
+#   FILE_TIMEOUT        - timeout baca/tulis (detik) untuk unggah dan unduh file (default 120)
+#   POOL_TIMEOUT        - lama menunggu koneksi kosong dari pool (detik) (default 5)
+
+logger = logging.getLogger(__name__)
+
+# Batas jumlah dokumen dalam satu send_media_group dari Telegram
+MEDIA_GROUP_SIZE = 10
+
+# Fungsi untuk membaca konfigurasi angka dari environment
+def _get_config(name, default, cast=int):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Nilai {name} tidak valid, memakai {default}.")
+        return cast(default)
+
+# Kelas request yang memisahkan pool koneksi: panggilan yang membawa file (unggah) dan unduhan file
+# memakai file_request, semua panggilan lain memakai message_request. Dengan begitu unggahan besar
+# tidak menghabiskan koneksi yang dipakai send_message untuk pengguna lain.
+class RoutingRequest(BaseRequest):
+    def __init__(self, message_request, file_request):
+        self.message_request = message_request
+        self.file_request = file_request
+
+    @property
+    def read_timeout(self):
+        return self.message_request.read_timeout
+
+    async def initialize(self):
+        await self.message_request.initialize()
+        await self.file_request.initialize()
+
+    async def shutdown(self):
+        await self.message_request.shutdown()
+        await self.file_request.shutdown()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        is_file_transfer = (request_data is not None and request_data.contains_files) or '/file/bot' in url
+        request = self.file_request if is_file_transfer else self.message_request
+        return await request.do_request(
+            url, method, request_data,
+            read_timeout=read_timeout, write_timeout=write_timeout,
+            connect_timeout=connect_timeout, pool_timeout=pool_timeout,
+        )
+
+# Fungsi untuk membuat objek request bot: RoutingRequest untuk semua panggilan API dan
+# request terpisah untuk get_updates agar long polling tidak memakai koneksi dari pool lain
+def build_requests():
+    http_version = os.getenv('HTTP_VERSION', '1.1')
+    pool_timeout = _get_config('POOL_TIMEOUT', '5', float)
+    message_timeout = _get_config('MESSAGE_TIMEOUT', '10', float)
+    file_timeout = _get_config('FILE_TIMEOUT', '120', float)
+    message_request = HTTPXRequest(
+        connection_pool_size=_get_config('MESSAGE_POOL_SIZE', '64'),
+        read_timeout=message_timeout,
+        write_timeout=message_timeout,
+        connect_timeout=message_timeout,
+        pool_timeout=pool_timeout,
+        http_version=http_version,
+    )
+    file_request = HTTPXRequest(
+        connection_pool_size=_get_config('FILE_POOL_SIZE', '16'),
+        read_timeout=file_timeout,
+        write_timeout=file_timeout,
+        media_write_timeout=file_timeout,
+        connect_timeout=message_timeout,
+        pool_timeout=pool_timeout,
+        http_version=http_version,
+    )
+    get_updates_request = HTTPXRequest(connection_pool_size=1, http_version=http_version)
+    return RoutingRequest(message_request, file_request), get_updates_request
+
+# Fungsi untuk mengirim hasil dari buffer sebagai dokumen lalu menutup buffernya.
+# Laju dan RetryAfter ditangani pembatas laju Application, atau call_with_flood_wait jika pembatas dimatikan
+# (lihat pembatas.py), jadi tidak diulang di sini.
+async def send_output(update, output):
+    async def upload():
+        output.seek(0)
+        await update.message.reply_document(document=output, filename=output.filename)
+
+    try:
+        await call_with_flood_wait(update.get_bot(), upload)
+        logger.info(f"Sent file: {output.filename}")
+    finally:
+        output.close()
+
+# Fungsi untuk mengirim 2-10 buffer dalam satu send_media_group, kembali ke pengiriman satu per satu jika gagal
+async def send_output_group(update, outputs):
+    async def upload():
+        media = []
+        for output in outputs:
+            output.seek(0)
+            media.append(telegram.InputMediaDocument(media=output, filename=output.filename))
+        await update.message.reply_media_group(media=media)
+
+    try:
+        await call_with_flood_wait(update.get_bot(), upload)
+        logger.info(f"Sent {len(outputs)} files as media group: {', '.join(output.filename for output in outputs)}")
+    except (telegram.error.RetryAfter, telegram.error.TimedOut):
+        # RetryAfter sudah diulang pembatas laju atau call_with_flood_wait; setelah timeout grup mungkin sudah terkirim, jangan kirim ulang
+        raise
+    except telegram.error.TelegramError as e:
+        logger.warning(f"send_media_group failed ({e}), sending files one by one.")
+        for output in outputs:
+            await send_output(update, output)
+    finally:
+        for output in outputs:
+            output.close()
+
+# Fungsi untuk mengirim satu kelompok buffer, memakai send_media_group jika isinya lebih dari satu
+async def send_output_chunk(update, outputs):
+    if len(outputs) == 1:
+        await send_output(update, outputs[0])
+    else:
+        await send_output_group(update, outputs)
+
+# Fungsi untuk menyalin satu buffer ke dalam arsip ZIP yang sedang ditulis
+def _write_zip_entry(archive, part):
+    part.seek(0)
+    with archive.open(part.filename, 'w', force_zip64=True) as entry:
+        shutil.copyfileobj(part, entry, 1024 * 1024)
+
+# Fungsi untuk mengubah iterable biasa maupun async iterable menjadi async iterator
+async def _iterate(parts):
+    if hasattr(parts, '__aiter__'):
+        async for part in parts:
+            yield part
+    else:
+        for part in parts:
+            yield part
+
+# Fungsi untuk mengirim banyak file hasil sesuai urutan bagian.
+# parts boleh berupa list buffer atau async generator yang membuat bagian satu per satu (producer);
+# pembuatan bagian berikutnya (sampai prefetch kelompok di depan) berjalan selama bagian sebelumnya diunggah,
+# tetapi satu pengirim mengirim kelompok bergiliran, jadi urutan di chat selalu sama dengan urutan bagian.
+# Jika MEDIA_GROUP aktif, bagian dikumpulkan per 10 dan dikirim dengan satu send_media_group.
+# Jika zip_name diisi, semua bagian dikirim sebagai satu arsip ZIP (lihat send_outputs_zip).
+async def send_outputs(update, parts, prefetch=None, group=None, zip_name=None):
+    if zip_name:
+        return await send_outputs_zip(update, parts, zip_name)
+    prefetch = max(1, prefetch or _get_config('UPLOAD_PREFETCH', '3'))
+    if group is None:
+        group = _get_config('MEDIA_GROUP', '1') != 0
+    group_size = MEDIA_GROUP_SIZE if group else 1
+    queue = asyncio.Queue(maxsize=prefetch)
+
+    async def producer():
+        chunk = []
+        try:
+            async for part in _iterate(parts):
+                chunk.append(part)
+                if len(chunk) == group_size:
+                    await queue.put(chunk)
+                    chunk = []
+            if chunk:
+                await queue.put(chunk)
+                chunk = []
+            await queue.put(None)
+        except Exception as e:
+            # Kesalahan saat membuat bagian diteruskan ke pengirim lewat antrean
+            await queue.put(e)
+        finally:
+            for part in chunk:
+                part.close()
+
+    sent = 0
+    producer_task = asyncio.ensure_future(producer())
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return sent
+            if isinstance(item, Exception):
+                raise item
+            await send_output_chunk(update, item)
+            sent += len(item)
+    finally:
+        producer_task.cancel()
+        try:
+            await producer_task
+        except asyncio.CancelledError:
+            pass
+        # Tutup bagian yang belum sempat dikirim dan hentikan producer jika terjadi kesalahan
+        while not queue.empty():
+            item = queue.get_nowait()
+            if isinstance(item, list):
+                for part in item:
+                    part.close()
+        if hasattr(parts, 'aclose'):
+            await parts.aclose()
+
+# Fungsi untuk menulis semua bagian ke satu arsip ZIP begitu bagian selesai dibuat, lalu mengirimnya
+# sebagai satu dokumen. Arsip ditulis ke OutputBuffer sehingga hanya memakai file sementara jika besar.
+async def send_outputs_zip(update, parts, zip_name):
+    archive_buffer = OutputBuffer(zip_name)
+    count = 0
+    try:
+        with zipfile.ZipFile(archive_buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            async for part in _iterate(parts):
+                try:
+                    await run_io(_write_zip_entry, archive, part)
+                finally:
+                    part.close()
+                count += 1
+    except BaseException:
+        archive_buffer.close()
+        if hasattr(parts, 'aclose'):
+            await parts.aclose()
+        raise
+    if count:
+        await send_output(update, archive_buffer)
+    else:
+        archive_buffer.close()
+    return count
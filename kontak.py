@@ -0,0 +1,1476 @@
+import io
+import os
+import mmap
+import codecs
+import re
+import shutil
+import tempfile
+import heapq
+import itertools
+import collections
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+import openpyxl
+from openpyxl.utils import column_index_from_string
+
+# Modul ini berisi fungsi pengolahan kontak yang tidak bergantung pada Telegram,
+# sehingga bisa dipakai ulang oleh bot.py tanpa menjalankan bot.
+# Semua fungsi di sini bisa dijalankan di pool proses (lihat pekerja.py).
+
+# Batas ukuran hasil yang disimpan di memori sebelum dipindah ke file sementara
+SPOOL_MAX_SIZE = int(os.getenv('SPOOL_MAX_SIZE', str(32 * 1024 * 1024)))
+SPOOL_DIR = 'cache'
+
+# Jumlah nilai per potongan saat membaca kolom pertama file .xlsx
+XLSX_CHUNK_SIZE = 10000
+
+# Jumlah baris per potongan saat membaca file teks, dan ukuran sampel untuk menebak encoding
+TEXT_CHUNK_SIZE = 10000
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+# Ukuran potongan byte yang diproses sekaligus oleh penghitung cepat /jumlah
+COUNT_CHUNK_SIZE = 8 * 1024 * 1024
+
+# /rapih memakai external sort untuk file yang lebih besar dari batas ini, dengan potongan RAPIH_RUN_SIZE nomor
+RAPIH_EXTERNAL_MIN_SIZE = int(os.getenv('RAPIH_EXTERNAL_MIN_SIZE', str(256 * 1024 * 1024)))
+RAPIH_RUN_SIZE = int(os.getenv('RAPIH_RUN_SIZE', '1000000'))
+
+# Ukuran potongan byte saat /pecah mencari batas kontak dan menyalin bagian
+SPLIT_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Cara /hapus mencocokkan nomor: 'substring' (baris dihapus jika mengandung nomor) atau 'exact' (harus sama persis)
+DELETE_MATCH_MODE = os.getenv('DELETE_MATCH_MODE', 'substring')
+
+# Kelas buffer hasil: disimpan di memori, pindah ke file sementara unik jika melewati SPOOL_MAX_SIZE.
+# Bisa dikirim antar proses; hasil kecil dibawa sebagai bytes, hasil besar sebagai path file sementara.
+class OutputBuffer(io.BufferedIOBase):
+    def __init__(self, filename, max_size=None):
+        super().__init__()
+        self.filename = filename
+        self.max_size = SPOOL_MAX_SIZE if max_size is None else max_size
+        self.file = io.BytesIO()
+        self.path = None
+
+    def _rollover(self):
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(suffix=os.path.splitext(self.filename)[1], dir=SPOOL_DIR)
+        disk_file = os.fdopen(fd, 'w+b')
+        disk_file.write(self.file.getbuffer())
+        disk_file.seek(self.file.tell())
+        self.file = disk_file
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, data):
+        written = self.file.write(data)
+        if self.path is None and self.file.tell() > self.max_size:
+            self._rollover()
+        return written
+
+    def read(self, size=-1):
+        return self.file.read(size)
+
+    def read1(self, size=-1):
+        return self.file.read(size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+    def flush(self):
+        if not self.file.closed:
+            self.file.flush()
+
+    def size(self):
+        position = self.file.tell()
+        end = self.file.seek(0, io.SEEK_END)
+        self.file.seek(position)
+        return end
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self.file.close()
+            if self.path is not None and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def __getstate__(self):
+        state = {'filename': self.filename, 'max_size': self.max_size, 'path': self.path}
+        if self.path is None:
+            state['data'] = self.file.getvalue()
+        else:
+            # File sementara diserahkan ke proses penerima, jangan dihapus saat objek ini ditutup
+            self.file.close()
+            self.path = None
+        return state
+
+    def __setstate__(self, state):
+        self.filename = state['filename']
+        self.max_size = state['max_size']
+        self.path = state['path']
+        if self.path is None:
+            self.file = io.BytesIO(state['data'])
+        else:
+            self.file = open(self.path, 'r+b')
+        self.file.seek(0, io.SEEK_END)
+
+# Fungsi untuk membersihkan nomor telepon
+def clean_phone_number(number):
+    number = re.sub(r'\D', '', number)  # Hapus semua karakter non-numerik
+    if len(number) >= 8:
+        if not number.startswith('+'):
+            number = '+' + number
+        return number
+    return None
+
+# Tabel byte yang dihapus saat normalisasi: semua kecuali angka ASCII dan pemisah baris
+_NON_DIGIT_BYTES = bytes(b for b in range(256) if not 48 <= b <= 57 and b != 10)
+
+# Fungsi untuk mengambil angka saja dari banyak nilai sekaligus dalam satu lintasan byte (sejajar dengan input)
+def extract_digits(values):
+    # Akhiran baris (baris dari file teks) dibuang dulu agar jalur cepat di bawah tidak selalu gagal
+    values = [value.rstrip('\r\n') if isinstance(value, str) else str(value) for value in values]
+    if not values:
+        return []
+    text = '\n'.join(values)
+    if text.count('\n') != len(values) - 1:
+        # Ada nilai yang berisi baris baru (misalnya sel xlsx), hapus dulu agar urutan tetap sejajar
+        text = '\n'.join(value.replace('\n', '') for value in values)
+    return text.encode('utf-8').translate(None, _NON_DIGIT_BYTES).decode('ascii').split('\n')
+
+# Fungsi untuk menormalisasi banyak nomor sekaligus dalam satu lintasan byte.
+# Mengembalikan daftar nomor berawalan '+' (sejajar dengan input) dan mask numpy nomor yang valid.
+def normalize_phone_numbers(values):
+    digits = extract_digits(values)
+    if not digits:
+        return [], np.zeros(0, dtype=bool)
+    lengths = np.fromiter(map(len, digits), dtype=np.int64, count=len(digits))
+    return ['+' + number for number in digits], lengths >= 8
+
+# Fungsi untuk membersihkan banyak nomor sekaligus, hanya mengembalikan nomor yang valid
+def clean_phone_numbers(values):
+    numbers, valid = normalize_phone_numbers(values)
+    return [number for number, is_valid in zip(numbers, valid.tolist()) if is_valid]
+
+# Fungsi untuk mengubah nomor (angka saja) menjadi kunci int64: angka * 20 + panjangnya, sehingga nol di depan
+# tetap dibedakan. Hanya nomor 8-17 digit yang punya kunci; selainnya None.
+def phone_number_key(digits):
+    if 8 <= len(digits) <= 17:
+        return int(digits) * 20 + len(digits)
+    return None
+
+# Fungsi versi vektor dari phone_number_key: mengembalikan array int64 sejajar dengan input, -1 jika tanpa kunci
+def phone_number_keys(digits):
+    lengths = np.fromiter(map(len, digits), dtype=np.int64, count=len(digits))
+    valid = (lengths >= 8) & (lengths <= 17)
+    keys = np.full(len(digits), -1, dtype=np.int64)
+    if valid.any():
+        values = np.array(list(itertools.compress(digits, valid.tolist())))
+        keys[valid] = values.astype(np.int64) * 20 + lengths[valid]
+    return keys
+
+# Fungsi untuk menggabungkan dua array kunci terurut menjadi satu array terurut tanpa duplikat
+def _merge_sorted_keys(first, second):
+    merged = np.concatenate([first, second])
+    merged.sort(kind='stable')
+    if len(merged) == 0:
+        return merged
+    return merged[np.concatenate(([True], merged[1:] != merged[:-1]))]
+
+# Kelas indeks nomor yang ringkas untuk jutaan nomor: kunci disimpan sebagai array int64 terurut
+# (8 byte per nomor, bukan objek string Python). Kunci baru menjadi run terurut kecil yang digabung dengan
+# run sebelumnya jika ukurannya setara, sehingga hanya ada sekitar log(n) run untuk dicari.
+class NumberIndex:
+    def __init__(self):
+        self.runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    @staticmethod
+    def _in_sorted(sorted_keys, keys):
+        positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+        return sorted_keys[positions] == keys
+
+    def contains(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self.runs:
+            found |= self._in_sorted(run, keys)
+        return found
+
+    def add(self, keys):
+        run = np.unique(np.asarray(keys, dtype=np.int64))
+        run = run[~self.contains(run)]
+        if len(run) == 0:
+            return
+        while self.runs and len(self.runs[-1]) <= 2 * len(run):
+            run = _merge_sorted_keys(self.runs.pop(), run)
+        self.runs.append(run)
+
+    # Fungsi untuk menyaring nilai yang masing-masing punya satu kunci (-1 = tanpa nomor, selalu disimpan).
+    # Nilai dibuang jika kuncinya sudah ada di indeks atau muncul lebih awal di potongan yang sama.
+    # Mengembalikan mask numpy "disimpan" lalu kunci baru ditambahkan ke indeks.
+    def admit_keys(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        keep = keys < 0
+        candidates = np.flatnonzero(~keep & ~self.contains(keys))
+        new_keys, first = np.unique(keys[candidates], return_index=True)
+        keep[candidates[first]] = True
+        self.add(new_keys)
+        return keep
+
+    # Fungsi untuk menyaring item dengan beberapa kunci (misalnya kontak dengan banyak TEL).
+    # Item dibuang jika semua kuncinya sudah ada di indeks atau muncul di item sebelumnya; item tanpa kunci disimpan.
+    # Mengembalikan daftar bool "disimpan" yang sejajar dengan item_keys, lalu kunci baru ditambahkan ke indeks.
+    def admit(self, item_keys):
+        flat = np.fromiter(itertools.chain.from_iterable(item_keys), dtype=np.int64)
+        seen = set(flat[self.contains(flat)].tolist()) if len(flat) else set()
+        new_keys = []
+        keep = []
+        for keys in item_keys:
+            if keys and all(key in seen for key in keys):
+                keep.append(False)
+                continue
+            keep.append(True)
+            for key in keys:
+                if key not in seen:
+                    seen.add(key)
+                    new_keys.append(key)
+        self.add(new_keys)
+        return keep
+
+# Kelas rekaman kontak yang sama untuk semua format: nomor (angka saja), nama (None jika tidak ada), dan nama file asal
+Contact = collections.namedtuple('Contact', ['number', 'name', 'source'])
+
+# Kelas kumpulan kontak yang padat untuk dibagi antar proses: nomor disimpan sebagai kunci int64
+# (lihat phone_number_key) dan nama sebagai indeks int32 ke tabel nama bersama (-1 = tanpa nama), jadi satu juta
+# kontak hanya ~12 MB dan dikirim ke pool proses sebagai array, bukan jutaan objek str.
+# Nomor lebih dari 17 angka tidak muat di int64: kuncinya -1 dan angkanya disimpan di kolom cadangan texts
+# (array objek sejajar dengan keys, None jika tidak ada nomor seperti itu), jadi tidak ada nomor yang hilang.
+# Potongan batch[a:b] adalah view tanpa salinan yang berbagi tabel nama; mask atau array indeks menghasilkan salinan.
+# Dipakai oleh handler yang memuat semua kontak sekaligus: /convert (termasuk saringan riwayat) dan /gabung.
+# Handler lain (/hapus, /hapus_duplikat, /pecah, /rapih, /extract) memproses file per potongan tanpa membuat batch.
+class ContactBatch:
+    def __init__(self, keys=(), name_ids=None, names=None, source=None, texts=None):
+        self.keys = np.asarray(keys, dtype=np.int64)
+        self.name_ids = np.full(len(self.keys), -1, dtype=np.int32) if name_ids is None else np.asarray(name_ids, dtype=np.int32)
+        self.names = [] if names is None else names
+        self.source = source
+        self.texts = texts
+
+    # Fungsi untuk membuat batch dari nomor (angka saja) dan nama sejajar (boleh None).
+    # Nomor kurang dari 8 angka dibuang; nomor lebih dari 17 angka masuk ke kolom texts.
+    @classmethod
+    def from_digits(cls, digits, names=None, source=None):
+        keys = phone_number_keys(digits)
+        unkeyed = np.flatnonzero(keys < 0).tolist()
+        long_numbers = [i for i in unkeyed if len(digits[i]) > 17]
+        texts = None
+        if long_numbers:
+            texts = np.full(len(keys), None, dtype=object)
+            texts[long_numbers] = [digits[i] for i in long_numbers]
+        valid = keys >= 0
+        valid[long_numbers] = True
+        if texts is not None:
+            texts = texts[valid]
+        if names is None:
+            return cls(keys[valid], source=source, texts=texts)
+        table = {}
+        name_ids = np.fromiter((-1 if name is None else table.setdefault(name, len(table)) for name in names),
+                               dtype=np.int32, count=len(names))
+        return cls(keys[valid], name_ids[valid], list(table), source, texts)
+
+    # Fungsi untuk menyambung beberapa batch menjadi satu; tabel nama digabung dan indeks nama disesuaikan
+    @classmethod
+    def concat(cls, batches, source=None):
+        batches = list(batches)
+        table = {}
+        keys = []
+        name_ids = []
+        for batch in batches:
+            # Elemen terakhir -1 dipakai oleh name_ids -1 (tanpa nama)
+            remap = np.array([table.setdefault(name, len(table)) for name in batch.names] + [-1], dtype=np.int32)
+            keys.append(batch.keys)
+            name_ids.append(remap[batch.name_ids])
+        if not keys:
+            return cls(source=source)
+        texts = None
+        if any(batch.texts is not None for batch in batches):
+            texts = np.concatenate([np.full(len(batch), None, dtype=object) if batch.texts is None else batch.texts
+                                    for batch in batches])
+        return cls(np.concatenate(keys), np.concatenate(name_ids), list(table), source, texts)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            key = int(self.keys[item])
+            name_id = int(self.name_ids[item])
+            number = str(key // 20).zfill(key % 20) if key >= 0 else self.texts[item]
+            return Contact(number, self.names[name_id] if name_id >= 0 else None, self.source)
+        texts = None if self.texts is None else self.texts[item]
+        return ContactBatch(self.keys[item], self.name_ids[item], self.names, self.source, texts)
+
+    def __iter__(self):
+        names = self.names
+        for number, name_id in zip(self.digits(), self.name_ids.tolist()):
+            yield Contact(number, names[name_id] if name_id >= 0 else None, self.source)
+
+    # Fungsi untuk mengubah kunci kembali menjadi nomor (angka saja, nol di depan tetap ada)
+    def digits(self):
+        if self.texts is None:
+            return [str(key // 20).zfill(key % 20) for key in self.keys.tolist()]
+        return [str(key // 20).zfill(key % 20) if key >= 0 else text for key, text in zip(self.keys.tolist(), self.texts)]
+
+    # Fungsi untuk mengambil nomor dalam format /convert (berawalan '+')
+    def phone_numbers(self):
+        return ['+' + number for number in self.digits()]
+
+    # Fungsi untuk membagi batch menjadi potongan berukuran size (view tanpa salinan)
+    def batches(self, size):
+        for start in range(0, len(self), size):
+            yield self[start:start + size]
+
+    # Fungsi untuk mengambil angka nomor-nomor panjang (kolom texts) sebagai set
+    def _long_numbers(self):
+        if self.texts is None:
+            return set()
+        return set(self.texts[self.keys < 0].tolist())
+
+    # Fungsi untuk memeriksa kontak mana yang nomornya ada di other: ContactBatch, array kunci, atau objek
+    # dengan contains(keys) seperti NumberIndex dan riwayat.NumberHistory. Nomor panjang (kolom texts)
+    # hanya bisa cocok dengan nomor panjang di ContactBatch lain.
+    def isin(self, other):
+        keyed = self.keys >= 0
+        if isinstance(other, ContactBatch):
+            found = np.isin(self.keys, other.keys[other.keys >= 0])
+        elif hasattr(other, 'contains'):
+            found = other.contains(self.keys)
+        else:
+            found = np.isin(self.keys, np.asarray(other, dtype=np.int64))
+        found &= keyed
+        if self.texts is not None and isinstance(other, ContactBatch):
+            long_numbers = other._long_numbers()
+            if long_numbers:
+                unkeyed = np.flatnonzero(~keyed)
+                found[unkeyed] = [text in long_numbers for text in self.texts[unkeyed].tolist()]
+        return found
+
+    # Fungsi untuk membuang nomor ganda, kemunculan pertama dipertahankan dan urutan tetap
+    def unique(self):
+        keep = np.zeros(len(self), dtype=bool)
+        keyed = np.flatnonzero(self.keys >= 0)
+        _, first = np.unique(self.keys[keyed], return_index=True)
+        keep[keyed[first]] = True
+        if self.texts is not None:
+            seen = set()
+            for i in np.flatnonzero(self.keys < 0).tolist():
+                if self.texts[i] not in seen:
+                    seen.add(self.texts[i])
+                    keep[i] = True
+        return self[keep]
+
+    # Fungsi untuk membuang kontak yang nomornya ada di other (lihat isin)
+    def difference(self, other):
+        return self[~self.isin(other)]
+
+    # Fungsi untuk mengambil kontak yang nomornya ada di other (lihat isin)
+    def intersection(self, other):
+        return self[self.isin(other)]
+
+
+
+VCARD_TEMPLATE = "BEGIN:VCARD\nVERSION:3.0\nFN:{name} {counter}\nTEL:{number}\nEND:VCARD\n"
+# Template kontak yang sudah punya nama sendiri (misalnya dari file .vcf lain), ditulis tanpa nomor urut
+NAMED_VCARD_TEMPLATE = "BEGIN:VCARD\nVERSION:3.0\nFN:{name}\nTEL:{number}\nEND:VCARD\n"
+
+# Kelas untuk menulis kontak .vcf secara streaming ke file handle biner
+class VcfWriter:
+    def __init__(self, file, contact_name, start=1, encoding='utf-8', chunk_size=4096):
+        self.file = file
+        self.contact_name = contact_name
+        self.counter = start
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.written = 0
+
+    def write(self, number, contact_name=None):
+        name = self.contact_name if contact_name is None else contact_name
+        self.file.write(VCARD_TEMPLATE.format(name=name, counter=self.counter, number=number).encode(self.encoding))
+        self.counter += 1
+        self.written += 1
+
+    def write_all(self, numbers, contact_name=None):
+        # Kontak ditulis per potongan agar jumlah pemanggilan write tetap kecil
+        name = self.contact_name if contact_name is None else contact_name
+        chunk = []
+        for number in numbers:
+            chunk.append(VCARD_TEMPLATE.format(name=name, counter=self.counter, number=number))
+            self.counter += 1
+            if len(chunk) >= self.chunk_size:
+                self.file.write(''.join(chunk).encode(self.encoding))
+                self.written += len(chunk)
+                chunk = []
+        if chunk:
+            self.file.write(''.join(chunk).encode(self.encoding))
+            self.written += len(chunk)
+        return self.written
+
+# Fungsi untuk membuat file .vcf dari daftar nomor atau ContactBatch
+def build_vcf(filename, numbers, contact_name, start=1):
+    output = OutputBuffer(filename)
+    if isinstance(numbers, ContactBatch):
+        numbers = numbers.phone_numbers()
+    VcfWriter(output, contact_name, start).write_all(numbers)
+    return output
+
+# Fungsi untuk membuat file .vcf dari beberapa kelompok kontak, counter dimulai dari 1 per kelompok
+def build_vcf_groups(filename, groups):
+    output = OutputBuffer(filename)
+    for numbers, contact_name in groups:
+        VcfWriter(output, contact_name).write_all(numbers)
+    return output
+
+# Fungsi untuk mengubah nilai sel .xlsx menjadi teks; angka bulat bertipe float ditulis tanpa '.0'
+def xlsx_cell_to_str(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+# Fungsi untuk membaca baris sheet pertama file .xlsx satu per satu (mode read-only openpyxl),
+# tanpa memuat seluruh workbook ke memori. Baris pertama adalah header.
+def iter_xlsx_rows(file_path, max_col=None):
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        yield from sheet.iter_rows(min_row=1, max_col=max_col, values_only=True)
+    finally:
+        workbook.close()
+
+# Fungsi untuk menulis header dan baris ke file .xlsx dengan mode write-only openpyxl.
+# Baris ditulis satu per satu (boleh dari generator) sehingga memori tetap kecil; NaN ditulis sebagai sel kosong.
+def write_xlsx(output, header, rows):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    if header:
+        sheet.append(list(header))
+    count = 0
+    for row in rows:
+        sheet.append([None if isinstance(value, float) and value != value else value for value in row])
+        count += 1
+    workbook.save(output)
+    return count
+
+# Fungsi untuk mengambil nama tag XML tanpa namespace
+def _xml_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+# Fungsi untuk mencari path sheet pertama dan daftar shared string di dalam arsip .xlsx
+def _xlsx_first_sheet(archive, load_strings=True, string_limit=None):
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    sheet = next(element for element in workbook.iter() if _xml_name(element.tag) == 'sheet')
+    sheet_rel = next(value for key, value in sheet.attrib.items() if key.endswith('}id'))
+    rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    sheet_path = None
+    shared_path = None
+    for rel in rels:
+        target = rel.get('Target', '')
+        target = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+        if rel.get('Id') == sheet_rel:
+            sheet_path = target
+        elif rel.get('Type', '').endswith('/sharedStrings'):
+            shared_path = target
+    shared_strings = []
+    if load_strings and shared_path and shared_path in archive.namelist():
+        with archive.open(shared_path) as shared_file:
+            for _, element in ET.iterparse(shared_file):
+                if _xml_name(element.tag) == 'si':
+                    # Teks bisa terpecah di beberapa run <r><t>; teks fonetik <rPh> diabaikan
+                    phonetic = {id(t) for rph in element.iter() if _xml_name(rph.tag) == 'rPh' for t in rph.iter()}
+                    shared_strings.append(''.join(t.text or '' for t in element.iter()
+                                                  if _xml_name(t.tag) == 't' and id(t) not in phonetic))
+                    element.clear()
+                    if string_limit is not None and len(shared_strings) >= string_limit:
+                        break
+    return sheet_path, shared_strings
+
+# Fungsi untuk mengubah satu elemen sel <c> menjadi teks seperti nilai sel di pandas/openpyxl
+def _xlsx_cell_text(cell, shared_strings):
+    cell_type = cell.get('t', 'n')
+    if cell_type == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iter() if _xml_name(t.tag) == 't')
+    value = next((child.text for child in cell if _xml_name(child.tag) == 'v'), None)
+    if value is None:
+        return None
+    if cell_type == 's':
+        return shared_strings[int(value)]
+    if cell_type == 'b':
+        return 'True' if value == '1' else 'False'
+    if cell_type == 'n' and any(char in value for char in '.eE'):
+        return xlsx_cell_to_str(float(value))
+    return value
+
+# Fungsi untuk menghitung jumlah baris data (tanpa header) di sheet pertama .xlsx tanpa membaca isi sel
+def count_xlsx_rows(file_path):
+    count = 0
+    with zipfile.ZipFile(file_path) as archive:
+        sheet_path, _ = _xlsx_first_sheet(archive, load_strings=False)
+        with archive.open(sheet_path) as sheet_file:
+            for _, element in ET.iterparse(sheet_file):
+                if _xml_name(element.tag) == 'row':
+                    count += 1
+                    element.clear()
+    return max(count - 1, 0)
+
+# Fungsi untuk membaca header (baris 1) .xlsx langsung dari XML. openpyxl read-only bisa memindai seluruh
+# sheet hanya untuk menghitung ukurannya, di sini hanya baris pertama dan shared string yang dipakainya yang dibaca.
+def read_xlsx_header(file_path):
+    cells = []
+    with zipfile.ZipFile(file_path) as archive:
+        sheet_path, _ = _xlsx_first_sheet(archive, load_strings=False)
+        with archive.open(sheet_path) as sheet_file:
+            for _, element in ET.iterparse(sheet_file):
+                if _xml_name(element.tag) == 'row':
+                    if element.get('r', '1') == '1':
+                        cells = [child for child in element if _xml_name(child.tag) == 'c']
+                    break
+        string_indexes = [int(child.text) for cell in cells if cell.get('t') == 's'
+                          for child in cell if _xml_name(child.tag) == 'v' and child.text]
+        shared_strings = []
+        if string_indexes:
+            _, shared_strings = _xlsx_first_sheet(archive, string_limit=max(string_indexes) + 1)
+    header = []
+    for cell in cells:
+        reference = cell.get('r')
+        if reference:
+            # Sel kosong di antara kolom tidak ditulis di XML, isi dengan None agar posisi kolom tetap
+            header.extend([None] * (column_index_from_string(reference.rstrip('0123456789')) - 1 - len(header)))
+        header.append(_xlsx_cell_text(cell, shared_strings))
+    return tuple(header)
+
+# Fungsi untuk membaca kolom pertama .xlsx (tanpa header) sebagai teks per potongan chunk_size nilai.
+# XML sheet dibaca langsung secara streaming dan hanya sel kolom A yang diambil, jauh lebih cepat
+# daripada membangun baris lengkap lewat openpyxl. Sel kosong dilewati.
+def iter_xlsx_first_column(file_path, chunk_size=XLSX_CHUNK_SIZE):
+    chunk = []
+    is_first_row = True
+    with zipfile.ZipFile(file_path) as archive:
+        sheet_path, shared_strings = _xlsx_first_sheet(archive)
+        with archive.open(sheet_path) as sheet_file:
+            for _, element in ET.iterparse(sheet_file):
+                if _xml_name(element.tag) != 'row':
+                    continue
+                # Baris 1 adalah header, sama seperti pd.read_excel
+                is_header = is_first_row and element.get('r', '1') == '1'
+                is_first_row = False
+                cells = [child for child in element if _xml_name(child.tag) == 'c']
+                if cells and not is_header:
+                    reference = cells[0].get('r')
+                    if reference is None or reference.rstrip('0123456789') == 'A':
+                        value = _xlsx_cell_text(cells[0], shared_strings)
+                        if value is not None:
+                            chunk.append(value)
+                            if len(chunk) >= chunk_size:
+                                yield chunk
+                                chunk = []
+                element.clear()
+    if chunk:
+        yield chunk
+
+# Fungsi untuk menebak encoding file teks dari potongan awalnya: BOM UTF-8/UTF-16 (ekspor Windows),
+# UTF-16 tanpa BOM (banyak byte nol), UTF-8, dan latin-1 sebagai cadangan yang selalu bisa dibaca
+def detect_encoding(file_path, sample_size=ENCODING_SAMPLE_SIZE):
+    with open(file_path, 'rb') as file:
+        sample = file.read(sample_size)
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith(codecs.BOM_UTF16_LE) or sample.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16'
+    if len(sample) >= 2 and sample.count(b'\x00') * 4 >= len(sample):
+        return 'utf-16-be' if sample[0::2].count(b'\x00') > sample[1::2].count(b'\x00') else 'utf-16-le'
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # Karakter multibyte yang terpotong di akhir sampel masih dianggap UTF-8
+        if e.start < len(sample) - 3:
+            return 'latin-1'
+    return 'utf-8'
+
+# Fungsi untuk membuka file teks dengan encoding hasil deteksi. Byte yang tetap tidak valid
+# diganti agar file tidak perlu dibaca ulang dengan encoding lain.
+def open_text(file_path):
+    return open(file_path, 'r', encoding=detect_encoding(file_path), errors='replace')
+
+# Fungsi untuk membaca baris file teks satu per satu
+def iter_text_lines(file_path):
+    with open_text(file_path) as file:
+        yield from file
+
+# Fungsi untuk membaca baris file teks per potongan chunk_size baris
+def iter_text_chunks(file_path, chunk_size=TEXT_CHUNK_SIZE):
+    with open_text(file_path) as file:
+        while True:
+            lines = list(itertools.islice(file, chunk_size))
+            if not lines:
+                return
+            yield lines
+
+# Pola satu baris isi vCard: [grup.]NAMA[;PARAMETER...]:NILAI, parameter boleh berisi teks dalam tanda kutip
+_VCARD_LINE = re.compile(r'^(?:[\w-]+\.)?([\w-]+)((?:;(?:[^:;"]|"[^"]*")*)*):(.*)$', re.S)
+_VCARD_PARAM = re.compile(r';((?:[^;"]|"[^"]*")*)')
+
+# Kelas satu kontak vCard: daftar properti (nama, parameter, nilai) dan teks aslinya dari BEGIN sampai END
+class VCard:
+    def __init__(self, properties, raw):
+        self.properties = properties
+        self.raw = raw
+
+    @property
+    def name(self):
+        return next((value for name, _, value in self.properties if name == 'FN'), None)
+
+    @property
+    def tels(self):
+        return [value for name, _, value in self.properties if name == 'TEL']
+
+# Fungsi untuk memecah satu baris isi vCard menjadi (nama, parameter, nilai), None jika bukan baris properti
+def parse_vcard_line(line):
+    match = _VCARD_LINE.match(line)
+    if match is None:
+        return None
+    name, params, value = match.groups()
+    return name.upper(), _VCARD_PARAM.findall(params), value
+
+# Fungsi untuk membaca file .vcf secara streaming dan menghasilkan VCard satu per satu.
+# Baris lanjutan (line folding, diawali spasi atau tab) digabung ke baris sebelumnya.
+def iter_vcards(file_path):
+    properties = None
+    raw = []
+    logical = None
+    for line in iter_text_lines(file_path):
+        if properties is None:
+            if line[:11].upper() == 'BEGIN:VCARD':
+                properties = []
+                raw = [line]
+                logical = None
+            continue
+        raw.append(line)
+        if line[:1] in (' ', '\t'):
+            if logical is not None:
+                logical += line[1:].rstrip('\r\n')
+            continue
+        if logical is not None:
+            parsed = parse_vcard_line(logical)
+            if parsed is not None:
+                properties.append(parsed)
+        logical = line.rstrip('\r\n')
+        if logical[:9].upper() == 'END:VCARD':
+            yield VCard(properties, ''.join(raw))
+            properties = None
+            logical = None
+    # Kontak terakhir tanpa END:VCARD tetap dihasilkan
+    if properties is not None:
+        if logical is not None:
+            parsed = parse_vcard_line(logical)
+            if parsed is not None:
+                properties.append(parsed)
+        yield VCard(properties, ''.join(raw))
+
+# Fungsi untuk mengambil nomor (angka saja, 8-15 digit) dari properti TEL di file .vcf per potongan
+def iter_vcf_numbers(file_path, chunk_size=TEXT_CHUNK_SIZE):
+    values = []
+    for card in iter_vcards(file_path):
+        values.extend(card.tels)
+        if len(values) >= chunk_size:
+            yield [number for number in extract_digits(values) if 8 <= len(number) <= 15]
+            values = []
+    if values:
+        yield [number for number in extract_digits(values) if 8 <= len(number) <= 15]
+
+# Fungsi untuk membaca nomor telepon dari file .txt atau .xlsx sebagai ContactBatch, None jika format tidak didukung.
+# Urutan dan nomor ganda dipertahankan; nomor dengan 8 angka atau lebih yang dipakai.
+def read_phone_numbers(file_path):
+    if file_path.endswith('.txt'):
+        chunks = iter_text_chunks(file_path)
+    elif file_path.endswith('.xlsx'):
+        chunks = iter_xlsx_first_column(file_path)
+    else:
+        return None
+    source = os.path.basename(file_path)
+    return ContactBatch.concat((ContactBatch.from_digits(extract_digits(values)) for values in chunks), source)
+
+# Fungsi untuk menambahkan kontak baru di awal file .vcf
+def add_contacts_to_vcf(file_path, new_contacts, new_contact_name):
+    # Tulis kontak baru di awal, lalu salin isi file lama tanpa memuatnya sekaligus
+    output = OutputBuffer(os.path.basename(file_path))
+    VcfWriter(output, new_contact_name).write_all(clean_phone_numbers(new_contacts))
+    with open(file_path, 'rb') as vcf_file:
+        shutil.copyfileobj(vcf_file, output, 1024 * 1024)
+    return output
+
+# Fungsi untuk mengekstrak nomor dari file .vcf ke .txt, None jika hasilnya kosong
+def extract_vcf_to_txt(file_path, filename):
+    # Hanya properti TEL yang dibaca, jadi angka di FN, tanggal, atau foto tidak ikut terambil
+    output = OutputBuffer(filename)
+    count = 0
+    for numbers in iter_vcf_numbers(file_path):
+        if numbers:
+            output.write(("\n".join(numbers) + "\n").encode('utf-8'))
+            count += len(numbers)
+    if count == 0:
+        output.close()
+        return None
+    return output
+
+# Kelas automaton Aho-Corasick untuk angka 0-9: memeriksa apakah sebuah teks angka mengandung
+# salah satu dari banyak pola sekaligus dalam satu lintasan, berapa pun jumlah polanya
+class DigitMatcher:
+    def __init__(self, patterns):
+        children = [{}]
+        terminal = [False]
+        for pattern in patterns:
+            state = 0
+            for digit in pattern:
+                if digit not in children[state]:
+                    children.append({})
+                    terminal.append(False)
+                    children[state][digit] = len(children) - 1
+                state = children[state][digit]
+            terminal[state] = True
+
+        # Bangun tabel transisi lengkap (DFA) dengan BFS lewat tautan gagal
+        self.delta = [None] * len(children)
+        self.delta[0] = [children[0].get(str(digit), 0) for digit in range(10)]
+        fail = [0] * len(children)
+        queue = list(children[0].values())
+        index = 0
+        while index < len(queue):
+            state = queue[index]
+            index += 1
+            terminal[state] = terminal[state] or terminal[fail[state]]
+            fail_row = self.delta[fail[state]]
+            row = list(fail_row)
+            for digit, child in children[state].items():
+                row[int(digit)] = child
+                fail[child] = fail_row[int(digit)]
+                queue.append(child)
+            self.delta[state] = row
+        self.terminal = terminal
+
+    def search(self, digits):
+        delta = self.delta
+        terminal = self.terminal
+        state = 0
+        for digit in digits.encode('ascii'):
+            state = delta[state][digit - 48]
+            if terminal[state]:
+                return True
+        return False
+
+# Fungsi untuk membuat mask baris yang harus dihapus dari sepotong nilai.
+# Kedua sisi dibandingkan dalam bentuk angka saja; mode exact memakai isin (hash), mode substring memakai automaton.
+def deletion_mask(values, delete_set, matcher=None):
+    digits = extract_digits(values)
+    if matcher is None:
+        return pd.Series(digits, dtype=object).isin(delete_set).to_numpy()
+    return np.fromiter((matcher.search(number) for number in digits), dtype=bool, count=len(digits))
+
+# Fungsi untuk menghapus nomor tertentu dari file .txt atau .xlsx, None jika format tidak didukung.
+# File dibaca per potongan sehingga waktu proses sebanding dengan jumlah baris, bukan baris x nomor.
+def delete_numbers_from_file(file_path, delete_numbers, mode=None):
+    mode = mode or DELETE_MATCH_MODE
+    delete_set = {number for number in extract_digits(delete_numbers) if number}
+    matcher = DigitMatcher(delete_set) if mode == 'substring' else None
+    output = OutputBuffer(os.path.basename(file_path))
+    if file_path.endswith('.txt'):
+        for lines in iter_text_chunks(file_path):
+            mask = deletion_mask(lines, delete_set, matcher)
+            output.write(''.join(itertools.compress(lines, ~mask)).encode('utf-8'))
+        return output
+    elif file_path.endswith('.xlsx'):
+        def kept_rows(rows):
+            while True:
+                chunk = list(itertools.islice(rows, XLSX_CHUNK_SIZE))
+                if not chunk:
+                    return
+                values = ['' if not row or row[0] is None else xlsx_cell_to_str(row[0]) for row in chunk]
+                yield from itertools.compress(chunk, ~deletion_mask(values, delete_set, matcher))
+
+        rows = iter_xlsx_rows(file_path)
+        header = next(rows, ())
+        write_xlsx(output, header, kept_rows(rows))
+        return output
+    return None
+
+# Fungsi untuk menghitung jumlah kontak di file .vcf, .txt, atau .xlsx, None jika format tidak didukung
+def count_contacts(file_path):
+    count = count_contacts_fast(file_path)
+    if count is not None:
+        return count
+    if file_path.endswith('.vcf'):
+        return sum(len(numbers) for numbers in iter_vcf_numbers(file_path))
+    elif file_path.endswith('.txt'):
+        count = 0
+        with open_text(file_path) as file:
+            for line in file:
+                # Bersihkan baris dari tanda baca, spasi, huruf, dan tanda +
+                cleaned_line = re.sub(r'[^\d]', '', line)
+                # Cari nomor telepon di dalam setiap baris yang telah dibersihkan
+                count += len(re.findall(r'\b\d{8,15}\b', cleaned_line))
+        return count
+    elif file_path.endswith('.xlsx'):
+        count = 0
+        for chunk in iter_xlsx_first_column(file_path):
+            for number in chunk:
+                cleaned_number = re.sub(r'[^\d]', '', number)
+                count += len(re.findall(r'\b\d{8,15}\b', cleaned_number))
+        return count
+    return None
+
+# Pola baris TEL di level byte (dimulai dari baris baru sebelumnya, lebih cepat daripada re.M | re.I),
+# dan baris TEL yang diikuti baris lanjutan (tidak bisa dihitung per baris). Hanya nilai setelah blok
+# parameter yang diambil, karena parameter seperti waid=628... juga berisi angka.
+_TEL_LINE_BYTES = re.compile(rb'\n(?:[\w-]+\.)?[Tt][Ee][Ll](?:;[^:\r\n]*)?:([^\r\n]*)')
+_FOLDED_TEL_BYTES = re.compile(rb'\n(?:[\w-]+\.)?[Tt][Ee][Ll][;:][^\r\n]*\r?\n[ \t]')
+
+# Fungsi untuk menghitung baris yang berisi 8-15 angka dari potongan byte teks
+def _count_digit_lines(data, is_last):
+    digits = np.frombuffer(data.translate(None, _NON_DIGIT_BYTES), dtype=np.uint8)
+    boundaries = np.flatnonzero(digits == 10)
+    if is_last and (len(digits) == 0 or digits[-1] != 10):
+        boundaries = np.append(boundaries, len(digits))
+    lengths = np.diff(boundaries, prepend=-1) - 1
+    return int(np.count_nonzero((lengths >= 8) & (lengths <= 15)))
+
+# Fungsi untuk membagi file menjadi beberapa rentang byte yang berakhir tepat setelah baris baru
+def split_byte_ranges(file_path, parts):
+    size = os.path.getsize(file_path)
+    if size == 0 or parts <= 1:
+        return [(0, size)]
+    ranges = []
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = 0
+        for i in range(1, parts):
+            newline = data.find(b'\n', max(start, size * i // parts))
+            if newline == -1:
+                break
+            if newline + 1 > start:
+                ranges.append((start, newline + 1))
+                start = newline + 1
+        if start < size:
+            ranges.append((start, size))
+    return ranges
+
+# Fungsi penghitung cepat /jumlah untuk .txt dan .vcf: file di-mmap dan dipindai di level byte tanpa
+# decode. .txt dihitung per baris berisi 8-15 angka; .vcf dihitung per properti TEL dengan aturan yang sama.
+# start/end membatasi rentang byte (lihat split_byte_ranges) agar file besar bisa dihitung di beberapa proses.
+# Mengembalikan None jika jalur cepat tidak bisa dipakai (UTF-16, atau TEL .vcf yang terlipat).
+def count_contacts_fast(file_path, start=0, end=None):
+    is_vcf = file_path.endswith('.vcf')
+    if not is_vcf and not file_path.endswith('.txt'):
+        return None
+    if detect_encoding(file_path).startswith('utf-16'):
+        return None
+    size = os.path.getsize(file_path)
+    end = size if end is None else min(end, size)
+    if start >= end:
+        return 0
+    count = 0
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if is_vcf and _FOLDED_TEL_BYTES.search(data, max(start - 1, 0), end):
+            return None
+        position = start
+        while position < end:
+            chunk_end = min(position + COUNT_CHUNK_SIZE, end)
+            if chunk_end < end:
+                newline = data.rfind(b'\n', position, chunk_end)
+                chunk_end = newline + 1 if newline != -1 else chunk_end
+            if is_vcf:
+                values = _TEL_LINE_BYTES.findall(data, max(position - 1, 0), chunk_end)
+                if values:
+                    count += _count_digit_lines(b'\n'.join(values), True)
+            else:
+                count += _count_digit_lines(data[position:chunk_end], chunk_end == end)
+            position = chunk_end
+    return count
+
+# Fungsi untuk mengganti nama kontak di file .vcf
+def rename_contacts_in_file(file_path, old_name, new_name):
+    output = OutputBuffer(os.path.basename(file_path))
+    for lines in iter_text_chunks(file_path):
+        output.write(''.join(lines).replace(old_name, new_name).encode('utf-8'))
+    return output
+
+# Fungsi untuk membaca kontak dari file .txt, .xlsx, atau .vcf menjadi ContactBatch, None jika format tidak didukung.
+# .txt dan .xlsx (kolom pertama) memakai aturan /convert dan tidak punya nama;
+# .vcf memakai nomor TEL 8-15 angka dengan FN kontaknya sebagai nama.
+def read_contacts(file_path):
+    if not file_path.endswith('.vcf'):
+        return read_phone_numbers(file_path)
+    batches = []
+    cards = iter_vcards(file_path)
+    while True:
+        chunk = list(itertools.islice(cards, TEXT_CHUNK_SIZE))
+        if not chunk:
+            break
+        digits = []
+        names = []
+        for card in chunk:
+            numbers = [number for number in extract_digits(card.tels) if 8 <= len(number) <= 15]
+            digits.extend(numbers)
+            names.extend([card.name] * len(numbers))
+        batches.append(ContactBatch.from_digits(digits, names))
+    return ContactBatch.concat(batches, os.path.basename(file_path))
+
+# Fungsi untuk menulis beberapa ContactBatch ke satu file .txt, .vcf, atau .xlsx dalam satu lintasan.
+# .txt berisi nomor per baris, .vcf memakai nama asli kontak atau contact_name bernomor urut jika tidak ada,
+# .xlsx berisi kolom Nomor dan Nama. Jika dedup, semua batch disambung lalu nomor ganda dibuang dengan
+# ContactBatch.unique (kemunculan pertama yang ditulis).
+# Mengembalikan (buffer, jumlah kontak yang ditulis, jumlah duplikat).
+def write_contacts(batches, output_extension, filename, contact_name, dedup=False):
+    output = OutputBuffer(filename)
+    counter = collections.Counter()
+    if dedup:
+        merged = ContactBatch.concat(batches)
+        batches = [merged.unique()]
+        counter['duplicates'] = len(merged) - len(batches[0])
+
+    def chunks():
+        for batch in batches:
+            for chunk in batch.batches(TEXT_CHUNK_SIZE):
+                counter['written'] += len(chunk)
+                yield chunk
+
+    if output_extension == '.txt':
+        for chunk in chunks():
+            output.write(''.join(number + '\n' for number in chunk.digits()).encode('utf-8'))
+    elif output_extension == '.vcf':
+        sequence = 1
+        for chunk in chunks():
+            cards = []
+            for contact in chunk:
+                if contact.name:
+                    cards.append(NAMED_VCARD_TEMPLATE.format(name=contact.name, number='+' + contact.number))
+                else:
+                    cards.append(VCARD_TEMPLATE.format(name=contact_name, counter=sequence, number='+' + contact.number))
+                    sequence += 1
+            output.write(''.join(cards).encode('utf-8'))
+    elif output_extension == '.xlsx':
+        rows = ((contact.number, contact.name) for chunk in chunks() for contact in chunk)
+        write_xlsx(output, ['Nomor', 'Nama'], rows)
+    return output, counter['written'], counter['duplicates']
+
+# Fungsi untuk menyalin satu file teks ke output apa adanya (tanpa decode) jika sudah UTF-8, BOM dibuang.
+# File berencoding lain diubah ke UTF-8 per potongan. Mengembalikan karakter terakhir yang ditulis ('' jika kosong).
+def _copy_text_file(output, file_path):
+    encoding = detect_encoding(file_path)
+    if encoding not in ('utf-8', 'utf-8-sig'):
+        last = ''
+        for lines in iter_text_chunks(file_path):
+            output.write(''.join(lines).encode('utf-8'))
+            last = lines[-1][-1:]
+        return last
+    with open(file_path, 'rb') as file:
+        start = len(codecs.BOM_UTF8) if encoding == 'utf-8-sig' else 0
+        size = file.seek(0, io.SEEK_END)
+        if size <= start:
+            return ''
+        file.seek(size - 1)
+        last = file.read(1).decode('latin-1')
+        file.seek(start)
+        shutil.copyfileobj(file, output, 1024 * 1024)
+    return last
+
+# Fungsi untuk menyusun header gabungan (urutan kemunculan pertama) dari header beberapa file .xlsx.
+# Kolom dengan nama sama digabung; nama ganda dalam satu file dibedakan menurut urutan kemunculannya.
+# Mengembalikan (header gabungan, posisi di header gabungan untuk setiap kolom tiap file).
+def _align_xlsx_headers(headers):
+    keys = []
+    positions = {}
+    mappings = []
+    for header in headers:
+        occurrences = collections.Counter()
+        mapping = []
+        for column, name in enumerate(header):
+            name = name if name is not None else f"Unnamed: {column}"
+            key = (name, occurrences[name])
+            occurrences[name] += 1
+            if key not in positions:
+                positions[key] = len(keys)
+                keys.append(key)
+            mapping.append(positions[key])
+        mappings.append(mapping)
+    return [name for name, _ in keys], mappings
+
+# Fungsi untuk menggabungkan beberapa file .xlsx secara streaming ke satu workbook write-only: baris tiap file
+# dibaca satu per satu dan langsung ditulis, jadi biayanya linear dan memori tetap kecil.
+# Jika align_headers, kolom disusun mengikuti header gabungan dan kolom yang tidak dimiliki sebuah file dibiarkan
+# kosong (sel di luar header file tersebut diabaikan). Jika tidak, baris ditulis apa adanya di bawah header file pertama.
+# Jika index (NumberIndex) diberikan, baris yang nomor kolom pertamanya sudah ada dibuang.
+# Mengembalikan (jumlah baris yang ditulis, jumlah duplikat).
+def merge_xlsx_files(output, file_paths, align_headers=True, index=None):
+    headers = [read_xlsx_header(file_path) for file_path in file_paths]
+    if align_headers:
+        header, mappings = _align_xlsx_headers(headers)
+    else:
+        header, mappings = list(headers[0]) if headers else [], [None] * len(file_paths)
+    counter = collections.Counter()
+
+    def merged_rows():
+        for file_path, mapping in zip(file_paths, mappings):
+            rows = iter_xlsx_rows(file_path)
+            next(rows, None)
+            if index is not None:
+                rows = _iter_unique_xlsx_rows(rows, index, counter)
+            if mapping is None or mapping == list(range(len(header))):
+                yield from rows
+                continue
+            for row in rows:
+                aligned = [None] * len(header)
+                for position, value in zip(mapping, row):
+                    aligned[position] = value
+                yield aligned
+
+    count = write_xlsx(output, header, merged_rows())
+    return count, counter['duplicates']
+
+# Fungsi untuk menggabungkan beberapa file dengan format yang sama.
+# .txt dan .vcf disalin per blok byte; baris baru ditambahkan jika sebuah file tidak diakhiri baris baru,
+# agar baris terakhirnya tidak menempel ke baris pertama file berikutnya. Jika dedup, nomor yang sudah
+# muncul (di file mana pun) dibuang selama penggabungan dengan satu NumberIndex. .xlsx digabung lewat merge_xlsx_files.
+# Mengembalikan (buffer, jumlah duplikat yang dibuang, jumlah baris untuk .xlsx atau None).
+def merge_files(file_paths, file_extension, filename, dedup=False):
+    output = OutputBuffer(filename)
+    duplicates = 0
+    row_count = None
+    index = NumberIndex() if dedup else None
+    if file_extension in ['.vcf', '.txt']:
+        write_unique = _write_unique_vcf if file_extension == '.vcf' else _write_unique_txt
+        for file_path in file_paths:
+            if index is not None:
+                position = output.tell()
+                duplicates += write_unique(output, file_path, index)
+                if output.tell() > position:
+                    output.seek(-1, io.SEEK_CUR)
+                    last = output.read(1).decode('latin-1')
+                else:
+                    last = ''
+            else:
+                last = _copy_text_file(output, file_path)
+            if last not in ('', '\n'):
+                output.write(b'\n')
+    elif file_extension == '.xlsx':
+        row_count, duplicates = merge_xlsx_files(output, file_paths, index=index)
+    return output, duplicates, row_count
+
+# Fungsi untuk menghitung ukuran setiap bagian (jumlah kontak) dari total kontak dan cara memecah:
+# split_count bagian sama rata, atau per_part kontak per bagian. Bagian kosong tidak dibuat.
+def _split_sizes(total, split_count=None, per_part=None):
+    if per_part is not None:
+        return [min(per_part, total - start) for start in range(0, total, per_part)]
+    split_count = min(split_count, total)
+    if split_count <= 0:
+        return []
+    per_file, remainder = divmod(total, split_count)
+    return [per_file + (1 if i < remainder else 0) for i in range(split_count)]
+
+# Fungsi untuk menghitung jumlah baris setiap bagian .xlsx. Untuk max_bytes, jumlah baris per bagian
+# diperkirakan dari ukuran file karena ukuran .xlsx (terkompresi) baru diketahui setelah ditulis.
+def plan_xlsx_split(file_path, split_count=None, per_part=None, max_bytes=None):
+    total = count_xlsx_rows(file_path)
+    if max_bytes is not None:
+        per_part = max(1, total * max_bytes // max(os.path.getsize(file_path), 1))
+    return _split_sizes(total, split_count, per_part)
+
+# Fungsi generator untuk memecah file .xlsx secara streaming sesuai sizes (lihat plan_xlsx_split): baris dibaca
+# sekali dan ditulis langsung ke bagian yang sedang dibuat, dan setiap bagian dihasilkan begitu selesai.
+def iter_xlsx_parts(file_path, base_name, sizes):
+    rows = iter_xlsx_rows(file_path)
+    header = next(rows, ())
+    for i, part_size in enumerate(sizes):
+        part = OutputBuffer(f"{base_name}_{i+1}.xlsx")
+        write_xlsx(part, header, (row for _, row in zip(range(part_size), rows)))
+        yield part
+
+# Fungsi untuk memecah file .xlsx sekaligus, mengembalikan daftar buffer bagian
+def split_xlsx_file(file_path, base_name, split_count=None, per_part=None, max_bytes=None):
+    return list(iter_xlsx_parts(file_path, base_name, plan_xlsx_split(file_path, split_count, per_part, max_bytes)))
+
+# Pola awal kontak vCard di level byte (BEGIN:VCARD di awal baris)
+_VCARD_BEGIN_BYTES = re.compile(rb'\n[Bb][Ee][Gg][Ii][Nn]:[Vv][Cc][Aa][Rr][Dd]')
+
+# Fungsi untuk mencari posisi awal setiap kontak di rentang byte [start, end) per potongan, menghasilkan
+# array numpy berisi offset. Kontak .txt adalah satu baris; kontak .vcf dimulai dari baris BEGIN:VCARD,
+# teks sebelum kontak pertama ikut ke kontak pertama.
+def _iter_record_starts(data, start, end, is_vcf):
+    position = start
+    first = True
+    at_start = data[start:start + 11].upper() == b'BEGIN:VCARD'
+    while position < end:
+        chunk_end = min(position + SPLIT_CHUNK_SIZE, end)
+        if chunk_end < end:
+            newline = data.rfind(b'\n', position, chunk_end)
+            chunk_end = newline + 1 if newline != -1 else chunk_end
+        if is_vcf:
+            starts = [match.start() + 1 for match in _VCARD_BEGIN_BYTES.finditer(data, max(position - 1, 0), chunk_end)]
+            starts = np.array([offset for offset in starts if offset > start], dtype=np.int64)
+            if first and at_start:
+                starts = np.concatenate(([start], starts))
+                first = False
+            elif first and len(starts):
+                starts[0] = start
+                first = False
+        else:
+            newlines = np.flatnonzero(np.frombuffer(data[position:chunk_end], dtype=np.uint8) == 10) + position + 1
+            starts = newlines[newlines < end]
+            if first:
+                starts = np.concatenate(([start], starts))
+                first = False
+        if len(starts):
+            yield starts.astype(np.int64)
+        position = chunk_end
+
+# Fungsi untuk menghasilkan offset potong di antara kontak. Dengan sizes (jumlah kontak per bagian)
+# potongan jatuh di awal kontak ke-n; dengan max_bytes setiap bagian dibuat sepanjang mungkin tanpa
+# melewati max_bytes (kontak yang lebih besar dari max_bytes tetap menjadi satu bagian sendiri).
+def _iter_split_points(record_starts, end, sizes=None, max_bytes=None):
+    if sizes is not None:
+        cut_indexes = iter(itertools.accumulate(sizes[:-1]))
+        cut_index = next(cut_indexes, None)
+        seen = 0
+        for starts in record_starts:
+            while cut_index is not None and cut_index < seen + len(starts):
+                yield int(starts[cut_index - seen])
+                cut_index = next(cut_indexes, None)
+            seen += len(starts)
+        return
+    part_start = None
+    carry = np.empty(0, dtype=np.int64)
+    for starts in itertools.chain(record_starts, [np.array([end], dtype=np.int64)]):
+        is_final = starts[-1] == end
+        starts = np.concatenate((carry, starts))
+        if part_start is None:
+            part_start = int(starts[0])
+        while True:
+            limit = part_start + max_bytes
+            index = int(np.searchsorted(starts, limit, 'right')) - 1
+            if index == len(starts) - 1 and (not is_final or starts[-1] <= limit):
+                break
+            cut = int(starts[index])
+            if cut <= part_start:
+                cut = int(starts[np.searchsorted(starts, part_start, 'right')])
+                if cut == end:
+                    break
+            yield cut
+            part_start = cut
+        carry = starts[-1:]
+
+# Fungsi untuk mengubah file teks yang bukan UTF-8 menjadi salinan UTF-8 sementara di SPOOL_DIR
+def _transcode_to_utf8(file_path):
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(file_path)[1], dir=SPOOL_DIR)
+    with os.fdopen(fd, 'wb') as temp_file:
+        for lines in iter_text_chunks(file_path):
+            temp_file.write(''.join(lines).encode('utf-8'))
+    return temp_path
+
+# Fungsi untuk mencari rentang byte setiap bagian file .txt atau .vcf tanpa decode dan tanpa menyalin isinya:
+# file di-mmap dan batas kontak dicari di level byte. Mode split_count butuh satu pass tambahan untuk
+# menghitung kontak; per_part dan max_bytes cukup satu pass. File UTF-16 atau latin-1 diubah dulu ke
+# UTF-8 sementara agar hasilnya tetap UTF-8.
+# Mengembalikan (path sumber, daftar (awal, akhir)). Hasilnya kecil sehingga murah dikirim dari pool proses;
+# isi bagian dibuat dengan write_split_part saat dibutuhkan. Jika path sumber berbeda dari file_path,
+# pemanggil harus menghapusnya setelah semua bagian dibuat.
+def plan_text_split(file_path, split_count=None, per_part=None, max_bytes=None):
+    encoding = detect_encoding(file_path)
+    source_path = file_path if encoding in ('utf-8', 'utf-8-sig') else _transcode_to_utf8(file_path)
+    try:
+        size = os.path.getsize(source_path)
+        start = len(codecs.BOM_UTF8) if encoding == 'utf-8-sig' else 0
+        if size <= start:
+            return source_path, []
+        is_vcf = file_path.endswith('.vcf')
+        with open(source_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if max_bytes is not None:
+                points = _iter_split_points(_iter_record_starts(data, start, size, is_vcf), size, max_bytes=max_bytes)
+            else:
+                total = sum(len(starts) for starts in _iter_record_starts(data, start, size, is_vcf))
+                sizes = _split_sizes(total, split_count, per_part)
+                if not sizes:
+                    return source_path, []
+                points = _iter_split_points(_iter_record_starts(data, start, size, is_vcf), size, sizes=sizes)
+            return source_path, list(itertools.pairwise(itertools.chain([start], points, [size])))
+    except BaseException:
+        if source_path != file_path:
+            os.remove(source_path)
+        raise
+
+# Fungsi untuk menyalin rentang byte [start, end) dari file sumber ke buffer bagian baru
+def write_split_part(source_path, filename, start, end):
+    part = OutputBuffer(filename)
+    try:
+        with open(source_path, 'rb') as file:
+            file.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                data = file.read(min(SPLIT_CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                part.write(data)
+                remaining -= len(data)
+        return part
+    except BaseException:
+        part.close()
+        raise
+
+# Fungsi untuk memecah file .txt atau .vcf sekaligus (lihat plan_text_split), mengembalikan daftar buffer bagian
+def split_text_file(file_path, base_name, split_count=None, per_part=None, max_bytes=None):
+    ext = os.path.splitext(file_path)[1]
+    source_path, ranges = plan_text_split(file_path, split_count, per_part, max_bytes)
+    parts = []
+    try:
+        for start, end in ranges:
+            parts.append(write_split_part(source_path, f"{base_name}_{len(parts)+1}{ext}", start, end))
+        return parts
+    except BaseException:
+        for part in parts:
+            part.close()
+        raise
+    finally:
+        if source_path != file_path:
+            os.remove(source_path)
+
+# Fungsi untuk memecah file menjadi beberapa bagian, mengembalikan daftar buffer bagian.
+# Isi salah satu: split_count (jumlah bagian), per_part (jumlah kontak per bagian), atau max_bytes (ukuran maksimal per bagian).
+def split_file(file_path, base_name, split_count=None, per_part=None, max_bytes=None):
+    if file_path.endswith('.xlsx'):
+        return split_xlsx_file(file_path, base_name, split_count, per_part, max_bytes)
+    return split_text_file(file_path, base_name, split_count, per_part, max_bytes)
+
+# Fungsi untuk menyelesaikan hasil hapus duplikat: (None, 0) jika tidak ada duplikat, (None, jumlah duplikat)
+# jika tidak ada isi yang tersisa (semua nomor sudah ada di file sebelumnya atau riwayat), selain itu (buffer, jumlah duplikat).
+# File kosong tidak dikembalikan karena Telegram menolak mengunggah file 0 byte.
+def _dedup_result(output, duplicates, is_empty):
+    if duplicates == 0 or is_empty:
+        output.close()
+        return None, duplicates
+    return output, duplicates
+
+# Fungsi untuk menulis kontak .vcf yang nomornya belum ada di index (NumberIndex) ke output.
+# Kontak dibuang bila semua nomor TEL-nya sudah ada; kontak tanpa nomor selalu ditulis. Mengembalikan jumlah duplikat.
+def _write_unique_vcf(output, file_path, index):
+    duplicates = 0
+    cards = iter_vcards(file_path)
+    while True:
+        chunk = list(itertools.islice(cards, TEXT_CHUNK_SIZE))
+        if not chunk:
+            return duplicates
+        item_keys = []
+        for card in chunk:
+            keys = (phone_number_key(digits) for digits in extract_digits(card.tels))
+            item_keys.append([key for key in keys if key is not None])
+        keep = index.admit(item_keys)
+        duplicates += keep.count(False)
+        output.write(''.join(card.raw for card in itertools.compress(chunk, keep)).encode('utf-8'))
+
+# Fungsi untuk menulis baris .txt yang nomornya belum ada di index ke output; baris tanpa nomor selalu ditulis.
+# Mengembalikan jumlah duplikat.
+def _write_unique_txt(output, file_path, index):
+    duplicates = 0
+    for lines in iter_text_chunks(file_path):
+        keep = index.admit_keys(phone_number_keys(extract_digits(lines)))
+        duplicates += int(np.count_nonzero(~keep))
+        output.write(''.join(itertools.compress(lines, keep.tolist())).encode('utf-8'))
+    return duplicates
+
+# Fungsi untuk menghapus kontak duplikat dari file .vcf. Setiap kontak dikenali dari himpunan nomor TEL-nya
+# (angka saja, minimal 8 digit), sehingga kontak dengan beberapa nomor dibandingkan utuh. Kontak unik
+# langsung ditulis ke buffer selama file dibaca. Kontak tanpa nomor tidak dianggap duplikat.
+# Jika index (NumberIndex) diberikan, kontak dibuang bila semua nomornya sudah ada di index (dedup lintas file).
+# Mengembalikan (buffer, jumlah duplikat); buffer None jika tidak ada duplikat atau tidak ada kontak yang tersisa.
+def remove_duplicates_vcf(file_path, index=None):
+    output = OutputBuffer(os.path.basename(file_path))
+    if index is not None:
+        duplicates = _write_unique_vcf(output, file_path, index)
+        return _dedup_result(output, duplicates, output.size() == 0)
+
+    seen = set()
+    duplicates = 0
+    pending = []
+    for card in iter_vcards(file_path):
+        key = frozenset(number for number in extract_digits(card.tels) if len(number) >= 8)
+        if key:
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+        pending.append(card.raw)
+        if len(pending) >= TEXT_CHUNK_SIZE:
+            output.write(''.join(pending).encode('utf-8'))
+            pending = []
+    output.write(''.join(pending).encode('utf-8'))
+    return _dedup_result(output, duplicates, output.size() == 0)
+
+# Fungsi untuk menghapus nomor duplikat dari file .txt, mengembalikan (buffer, jumlah duplikat).
+# Jika index diberikan, baris dibuang bila nomornya sudah ada di index; baris tanpa nomor disimpan.
+# Buffer None jika tidak ada duplikat atau tidak ada baris yang tersisa.
+def remove_duplicates_txt(file_path, index=None):
+    numbers = set()
+    duplicates = 0
+    output = OutputBuffer(os.path.basename(file_path))
+    if index is not None:
+        duplicates = _write_unique_txt(output, file_path, index)
+    else:
+        for lines in iter_text_chunks(file_path):
+            new_lines = []
+            for line in lines:
+                number = clean_phone_number(line)
+                if number not in numbers:
+                    numbers.add(number)
+                    new_lines.append(line)
+                else:
+                    duplicates += 1
+            output.write(''.join(new_lines).encode('utf-8'))
+    return _dedup_result(output, duplicates, output.size() == 0)
+
+# Fungsi untuk menyaring baris .xlsx per potongan: baris dibuang jika nomor di kolom pertama sudah ada di index.
+# Jumlah baris yang dibuang ditambahkan ke counter['duplicates'].
+def _iter_unique_xlsx_rows(rows, index, counter):
+    while True:
+        chunk = list(itertools.islice(rows, XLSX_CHUNK_SIZE))
+        if not chunk:
+            return
+        values = ['' if not row or row[0] is None else xlsx_cell_to_str(row[0]) for row in chunk]
+        keep = index.admit_keys(phone_number_keys(extract_digits(values)))
+        counter['duplicates'] += int(np.count_nonzero(~keep))
+        counter['rows'] += int(np.count_nonzero(keep))
+        yield from itertools.compress(chunk, keep.tolist())
+
+# Fungsi untuk menghapus nomor duplikat dari file .xlsx, mengembalikan (buffer, jumlah duplikat).
+# Jika index diberikan, baris dibuang bila nomor di kolom pertama sudah ada di index.
+# Buffer None jika tidak ada duplikat atau tidak ada baris data yang tersisa (hanya header).
+def remove_duplicates_xlsx(file_path, index=None):
+    seen = set()
+    counter = collections.Counter()
+
+    def unique_rows(rows):
+        if index is not None:
+            yield from _iter_unique_xlsx_rows(rows, index, counter)
+            return
+        for row in rows:
+            key = row[0] if row else None
+            if key in seen:
+                counter['duplicates'] += 1
+                continue
+            seen.add(key)
+            counter['rows'] += 1
+            yield row
+
+    rows = iter_xlsx_rows(file_path)
+    header = next(rows, ())
+    output = OutputBuffer(os.path.basename(file_path))
+    write_xlsx(output, header, unique_rows(rows))
+    return _dedup_result(output, counter['duplicates'], counter['rows'] == 0)
+
+# Fungsi untuk menghapus duplikat lintas file: file diproses sesuai urutan dengan satu NumberIndex bersama,
+# sehingga nomor yang sudah muncul di file sebelumnya dibuang dari file berikutnya. Urutan isi tiap file tetap.
+# Mengembalikan daftar (buffer atau None, jumlah duplikat) sejajar dengan file_paths.
+def remove_duplicates_global(file_paths, index=None):
+    index = NumberIndex() if index is None else index
+    engines = {'.vcf': remove_duplicates_vcf, '.txt': remove_duplicates_txt, '.xlsx': remove_duplicates_xlsx}
+    return [engines[os.path.splitext(file_path)[1]](file_path, index) for file_path in file_paths]
+
+# Fungsi untuk menulis pasangan (nomor, jumlah) yang sudah urut ke buffer hasil /rapih.
+# Tanpa with_counts setiap nomor ditulis sebanyak kemunculannya; dengan with_counts ditulis sekali sebagai "nomor,jumlah".
+def _write_rapih_output(output, pairs, with_counts):
+    lines = []
+    first = True
+    for number, count in pairs:
+        lines.append(f"{number},{count}" if with_counts else "\n".join([number] * count))
+        if len(lines) >= TEXT_CHUNK_SIZE:
+            output.write((("" if first else "\n") + "\n".join(lines)).encode('utf-8'))
+            first = False
+            lines = []
+    if lines:
+        output.write((("" if first else "\n") + "\n".join(lines)).encode('utf-8'))
+
+# Fungsi untuk menulis satu potongan baris yang sudah diurutkan ke file sementara (run untuk external sort)
+def _write_sorted_run(lines, run_paths):
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix='.run', dir=SPOOL_DIR)
+    run_paths.append(path)
+    with os.fdopen(fd, 'w', encoding='utf-8') as run_file:
+        run_file.writelines(sorted(lines))
+
+# Fungsi untuk menggabungkan semua run yang sudah urut menjadi satu aliran baris urut
+def _merge_sorted_runs(run_paths):
+    run_files = [open(path, 'r', encoding='utf-8') for path in run_paths]
+    try:
+        yield from heapq.merge(*run_files)
+    finally:
+        for run_file in run_files:
+            run_file.close()
+
+# Fungsi untuk mengurutkan pasangan (nomor, jumlah) tanpa memuat semua nomor ke memori.
+# Tahap 1: nomor diurutkan per potongan lalu digabung sehingga nomor yang sama berurutan dan bisa dihitung.
+# Tahap 2: pasangan diberi kunci teks (10^12 - jumlah) agar urutan teks = jumlah terbanyak, lalu nomor.
+def _external_rapih_pairs(file_path, run_size):
+    number_runs = []
+    pair_runs = []
+    try:
+        run = []
+        for lines in iter_text_chunks(file_path):
+            run.extend(number + "\n" for number in clean_phone_numbers(lines))
+            if len(run) >= run_size:
+                _write_sorted_run(run, number_runs)
+                run = []
+        if run:
+            _write_sorted_run(run, number_runs)
+
+        run = []
+        for number, group in itertools.groupby(_merge_sorted_runs(number_runs)):
+            run.append(f"{10 ** 12 - sum(1 for _ in group):012d},{number}")
+            if len(run) >= run_size:
+                _write_sorted_run(run, pair_runs)
+                run = []
+        if run:
+            _write_sorted_run(run, pair_runs)
+
+        for line in _merge_sorted_runs(pair_runs):
+            key, number = line.rstrip('\n').split(',', 1)
+            yield number, 10 ** 12 - int(key)
+    finally:
+        for path in number_runs + pair_runs:
+            if os.path.exists(path):
+                os.remove(path)
+
+# Fungsi untuk merapihkan nomor di file .txt (urut berdasarkan jumlah kemunculan terbanyak, lalu nomor).
+# Jumlah kemunculan dihitung dengan Counter dalam satu lintasan; file yang lebih besar dari
+# RAPIH_EXTERNAL_MIN_SIZE (atau external=True) diurutkan dengan external sort di folder cache.
+def rapih_txt_file(file_path, with_counts=False, external=None):
+    if external is None:
+        external = os.path.getsize(file_path) > RAPIH_EXTERNAL_MIN_SIZE
+    output = OutputBuffer(os.path.basename(file_path))
+    if external:
+        _write_rapih_output(output, _external_rapih_pairs(file_path, RAPIH_RUN_SIZE), with_counts)
+        return output
+    number_counts = collections.Counter()
+    for lines in iter_text_chunks(file_path):
+        number_counts.update(clean_phone_numbers(lines))
+    pairs = sorted(number_counts.items(), key=lambda item: (-item[1], item[0]))
+    _write_rapih_output(output, pairs, with_counts)
+    return output
@@ -0,0 +1,82 @@
+import os
+import asyncio
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Modul ini menyediakan pool pekerja untuk tugas berat agar event loop bot tidak macet.
+# Parsing dan pembuatan file dijalankan di pool proses, operasi disk di pool thread.
+# Jumlah pekerja diatur lewat .env: PROCESS_WORKERS (0 = pakai thread saja) dan THREAD_WORKERS.
+# Pool proses memakai start method 'forkserver': fork dari proses bot yang sudah punya banyak thread
+# (event loop, httpx, pool thread) bisa membuat proses anak macet karena lock yang sedang dipegang thread lain.
+
+logger = logging.getLogger(__name__)
+
+_process_pool = None
+_thread_pool = None
+
+# Fungsi untuk membaca jumlah pekerja dari environment
+def _get_worker_count(name, default):
+    try:
+        return max(0, int(os.getenv(name, default)))
+    except ValueError:
+        logger.warning(f"Nilai {name} tidak valid, memakai {default}.")
+        return default
+
+# Fungsi untuk mendapatkan pool thread (dibuat saat pertama kali dipakai)
+def get_thread_pool():
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=_get_worker_count('THREAD_WORKERS', 8) or 1, thread_name_prefix='pekerja-io')
+    return _thread_pool
+
+# Fungsi untuk mendapatkan pool proses, None jika pool proses dimatikan
+def get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        workers = _get_worker_count('PROCESS_WORKERS', os.cpu_count() or 1)
+        if workers == 0:
+            return None
+        _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver'))
+        logger.info(f"Process pool started with {workers} workers.")
+    return _process_pool
+
+# Fungsi untuk membuat semua pool di awal (dipanggil dari post_init), sebelum permintaan pertama masuk
+def start_pools():
+    get_process_pool()
+    get_thread_pool()
+
+# Fungsi untuk mengetahui berapa tugas CPU yang bisa berjalan bersamaan
+def get_cpu_worker_count():
+    return _get_worker_count('PROCESS_WORKERS', os.cpu_count() or 1) or _get_worker_count('THREAD_WORKERS', 8) or 1
+
+# Fungsi untuk menjalankan tugas CPU (parsing, pembuatan file) di pool proses
+async def run_cpu(func, *args, **kwargs):
+    global _process_pool
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool() or get_thread_pool()
+    try:
+        return await loop.run_in_executor(pool, functools.partial(func, *args, **kwargs))
+    except BrokenProcessPool:
+        # Pekerja mati (misalnya kehabisan memori), buat pool baru untuk tugas berikutnya
+        logger.error(f"Process pool broken while running {func.__name__}, restarting pool.")
+        if pool is _process_pool:
+            _process_pool = None
+        raise
+
+# Fungsi untuk menjalankan tugas I/O disk di pool thread
+async def run_io(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_thread_pool(), functools.partial(func, *args, **kwargs))
+
+# Fungsi untuk menutup semua pool saat bot berhenti
+def shutdown_pools():
+    global _process_pool, _thread_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
@@ -0,0 +1,218 @@
+import os
+import asyncio
+import logging
+import random
+import datetime
+import telegram
+from telegram.ext import BaseRateLimiter, BaseUpdateProcessor
+
+# Modul ini berisi pembatas laju (rate limiter) untuk semua panggilan ke API Telegram.
+# Setiap panggilan yang punya chat_id harus mendapat token dari ember (token bucket) global dan
+# ember milik chat tujuan sebelum dikirim, sehingga bot melambat sendiri sebelum kena 429.
+# Konfigurasi lewat .env:
+#   RATE_LIMIT            - '0' untuk mematikan pembatas (default 1)
+#   RATE_LIMIT_OVERALL    - pesan per detik untuk seluruh bot (default 30)
+#   RATE_LIMIT_CHAT       - pesan per detik untuk satu chat pribadi (default 1)
+#   RATE_LIMIT_CHAT_BURST - jumlah pesan beruntun yang boleh dikirim ke satu chat (default 3)
+#   RATE_LIMIT_GROUP      - pesan per menit untuk satu grup atau channel (default 20)
+#   RATE_LIMIT_RETRIES    - berapa kali panggilan diulang setelah RetryAfter (default 3)
+# Hanya pembatas ini yang mengulang panggilan setelah RetryAfter. Jika RATE_LIMIT=0, pengiriman pesan dan file
+# memakai call_with_flood_wait yang menunggu selama waktu RetryAfter lalu mengulang sendiri.
+#   CONCURRENT_UPDATES    - berapa update dari pengguna berbeda yang diproses bersamaan (default 64, lihat PerUserUpdateProcessor)
+
+logger = logging.getLogger(__name__)
+
+# Endpoint yang tidak mengirim apa pun ke chat dan tidak perlu dibatasi
+UNLIMITED_ENDPOINTS = {'getUpdates', 'getFile', 'getMe', 'setWebhook', 'deleteWebhook', 'getWebhookInfo'}
+
+# Ember chat yang lama tidak dipakai dibuang agar dict tidak terus membesar
+MAX_IDLE_BUCKETS = 10000
+
+# Fungsi untuk mengubah RetryAfter.retry_after (int atau timedelta) menjadi detik
+def retry_after_seconds(error):
+    retry_after = error.retry_after
+    if isinstance(retry_after, datetime.timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+# Fungsi untuk menjalankan panggilan API call() dan mengulanginya setelah RetryAfter, tetapi hanya jika bot
+# tidak memakai pembatas laju (RATE_LIMIT=0). Jika pembatas aktif, RetryAfter sudah diulang di sana dan diteruskan.
+async def call_with_flood_wait(bot, call):
+    max_retries = _get_retry_count()
+    for attempt in range(max_retries + 1):
+        try:
+            return await call()
+        except telegram.error.RetryAfter as e:
+            if bot.rate_limiter is not None or attempt == max_retries:
+                raise
+            delay = retry_after_seconds(e)
+            logger.warning(f"RetryAfter {delay} seconds without rate limiter, attempt {attempt + 1} of {max_retries}.")
+            await asyncio.sleep(delay)
+
+# Fungsi untuk membaca RATE_LIMIT_RETRIES dari environment
+def _get_retry_count():
+    try:
+        return int(os.getenv('RATE_LIMIT_RETRIES', '3'))
+    except ValueError:
+        return 3
+
+# Fungsi untuk menghitung jeda exponential backoff dengan full jitter
+def backoff_delay(attempt, base_delay=1.0, max_delay=30.0):
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+# Kelas token bucket: rate token per detik, menampung paling banyak capacity token.
+# Penunggu dilayani bergiliran lewat lock, dan pause() menahan ember sampai waktu tertentu.
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = asyncio.get_running_loop().time()
+        self.paused_until = 0
+        self.lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds):
+        loop = asyncio.get_running_loop()
+        self.paused_until = max(self.paused_until, loop.time() + seconds)
+
+    def is_idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity and not self.lock.locked() and self.paused_until <= now
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        async with self.lock:
+            while True:
+                now = loop.time()
+                if self.paused_until > now:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# Kelas pembatas laju untuk ApplicationBuilder.rate_limiter().
+# Batas global berlaku untuk semua chat, batas per chat dibedakan antara chat pribadi dan grup.
+# RetryAfter dari Telegram menahan ember chat tersebut (atau ember global jika tanpa chat_id)
+# selama waktu yang diminta, lalu panggilan diulang. rate_limit_args boleh berisi
+# {'max_retries': n} untuk mengganti jumlah pengulangan pada satu panggilan.
+class TelegramRateLimiter(BaseRateLimiter):
+    def __init__(self, overall_rate=30, chat_rate=1, chat_burst=3, group_per_minute=20, max_retries=3):
+        self.overall_rate = overall_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_per_minute = group_per_minute
+        self.max_retries = max_retries
+        self.overall_bucket = None
+        self.chat_buckets = {}
+
+    async def initialize(self):
+        self.overall_bucket = TokenBucket(self.overall_rate, self.overall_rate)
+
+    async def shutdown(self):
+        self.chat_buckets.clear()
+
+    # Fungsi untuk mengambil ember milik sebuah chat; chat_id negatif atau @username adalah grup/channel
+    def _get_chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= MAX_IDLE_BUCKETS:
+                now = asyncio.get_running_loop().time()
+                for key in [key for key, value in self.chat_buckets.items() if value.is_idle(now)]:
+                    del self.chat_buckets[key]
+            try:
+                is_group = int(chat_id) < 0
+            except (TypeError, ValueError):
+                is_group = True
+            if is_group:
+                bucket = TokenBucket(self.group_per_minute / 60, self.group_per_minute)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if self.overall_bucket is None:
+            await self.initialize()
+        chat_id = data.get('chat_id')
+        if endpoint in UNLIMITED_ENDPOINTS or chat_id is None:
+            return await callback(*args, **kwargs)
+
+        max_retries = self.max_retries
+        if isinstance(rate_limit_args, dict):
+            max_retries = rate_limit_args.get('max_retries', max_retries)
+        chat_bucket = self._get_chat_bucket(chat_id)
+        for attempt in range(max_retries + 1):
+            await chat_bucket.acquire()
+            await self.overall_bucket.acquire()
+            try:
+                return await callback(*args, **kwargs)
+            except telegram.error.RetryAfter as e:
+                delay = retry_after_seconds(e)
+                # Tahan chat ini sampai Telegram mengizinkan lagi, pesan lain ke chat yang sama ikut menunggu
+                chat_bucket.pause(delay)
+                if attempt == max_retries:
+                    raise
+                logger.warning(f"RetryAfter {delay} seconds on {endpoint} to {chat_id}, attempt {attempt + 1} of {max_retries}.")
+
+# Fungsi untuk membuat pembatas laju dari konfigurasi .env, None jika dimatikan
+def build_rate_limiter():
+    if os.getenv('RATE_LIMIT', '1') == '0':
+        return None
+    try:
+        return TelegramRateLimiter(
+            overall_rate=float(os.getenv('RATE_LIMIT_OVERALL', '30')),
+            chat_rate=float(os.getenv('RATE_LIMIT_CHAT', '1')),
+            chat_burst=float(os.getenv('RATE_LIMIT_CHAT_BURST', '3')),
+            group_per_minute=float(os.getenv('RATE_LIMIT_GROUP', '20')),
+            max_retries=int(os.getenv('RATE_LIMIT_RETRIES', '3')),
+        )
+    except ValueError:
+        logger.warning("Konfigurasi RATE_LIMIT tidak valid, memakai nilai bawaan.")
+        return TelegramRateLimiter()
+# Kelas pemroses update untuk ApplicationBuilder.concurrent_updates(): update dari pengguna berbeda diproses
+# bersamaan, tetapi update dari satu pengguna tetap berurutan sesuai kedatangannya. Handler menyimpan status
+# alur perintah di user_data (file_paths, /done, nama file), jadi dua update dari pengguna yang sama tidak boleh
+# saling menyalip; pengguna lain tidak perlu menunggu /convert besar milik orang lain.
+# Update tanpa pengguna (misalnya post channel) langsung diproses.
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        # user id -> [lock, jumlah update yang memakai lock]; entri dibuang saat tidak ada lagi yang menunggu
+        self.user_locks = {}
+
+    async def do_process_update(self, update, coroutine):
+        user = getattr(update, 'effective_user', None)
+        if user is None:
+            await coroutine
+            return
+        entry = self.user_locks.setdefault(user.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.user_locks[user.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self.user_locks.clear()
+
+# Fungsi untuk membuat pemroses update dari konfigurasi .env
+def build_update_processor():
+    try:
+        max_concurrent_updates = int(os.getenv('CONCURRENT_UPDATES', '64'))
+    except ValueError:
+        logger.warning("Konfigurasi CONCURRENT_UPDATES tidak valid, memakai nilai bawaan.")
+        max_concurrent_updates = 64
+    return PerUserUpdateProcessor(max(max_concurrent_updates, 1))
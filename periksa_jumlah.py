@@ -0,0 +1,47 @@
+import os
+import sys
+import argparse
+import tempfile
+from kontak import count_contacts_fast, iter_vcf_numbers
+
+# Skrip untuk memeriksa bahwa penghitung cepat /jumlah (count_contacts_fast) sama dengan hasil tokenizer
+# vCard (iter_vcf_numbers). Tanpa argumen, contoh kartu bawaan di bawah yang diperiksa; dengan argumen,
+# file .vcf yang diberikan ikut diperiksa.
+# Contoh: python periksa_jumlah.py kontak1.vcf kontak2.vcf
+
+# Contoh kartu dengan berbagai bentuk baris TEL, termasuk parameter berisi angka (ekspor WhatsApp)
+SAMPLE_CARDS = (
+    "BEGIN:VCARD\r\nVERSION:3.0\r\nFN:Polos\r\nTEL:+6281234567890\r\nEND:VCARD\r\n"
+    "BEGIN:VCARD\r\nVERSION:3.0\r\nFN:WhatsApp\r\n"
+    "item1.TEL;type=CELL;waid=6281234567890:+62 812-3456-7890\r\nEND:VCARD\r\n"
+    "BEGIN:VCARD\r\nVERSION:3.0\r\nFN:Tipe\r\nTEL;TYPE=CELL;TYPE=VOICE:0812 3456 7891\r\n"
+    "tel;type=work:+62 21 555 0100\r\nEND:VCARD\r\n"
+    "BEGIN:VCARD\r\nVERSION:4.0\r\nFN:Uri\r\nTEL;VALUE=uri;PREF=1:tel:+62-812-3456-7892\r\nEND:VCARD\r\n"
+    "BEGIN:VCARD\r\nVERSION:3.0\r\nFN:Pendek\r\nTEL;TYPE=HOME:12345\r\nEND:VCARD\r\n"
+)
+
+# Fungsi untuk membandingkan kedua penghitung pada satu file, mengembalikan True jika sama
+def check_file(file_path):
+    fast = count_contacts_fast(file_path)
+    slow = sum(len(numbers) for numbers in iter_vcf_numbers(file_path))
+    if fast is None:
+        print(f"{file_path}: jalur cepat tidak dipakai, tokenizer {slow}")
+        return True
+    print(f"{file_path}: cepat {fast}, tokenizer {slow}" + ("" if fast == slow else "  <-- BERBEDA"))
+    return fast == slow
+
+def main():
+    parser = argparse.ArgumentParser(description="Bandingkan penghitung cepat /jumlah dengan tokenizer vCard.")
+    parser.add_argument('files', nargs='*', help="File .vcf tambahan yang diperiksa")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        sample_path = os.path.join(temp_dir, 'contoh.vcf')
+        with open(sample_path, 'w', encoding='utf-8', newline='') as sample_file:
+            sample_file.write(SAMPLE_CARDS)
+        results = [check_file(sample_path)]
+    results.extend(check_file(file_path) for file_path in args.files)
+    sys.exit(0 if all(results) else 1)
+
+if __name__ == '__main__':
+    main()
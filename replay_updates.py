@@ -0,0 +1,59 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import httpx
+from dotenv import load_dotenv
+
+# Skrip untuk menguji mode webhook secara lokal: memutar ulang update yang direkam dengan
+# RECORD_UPDATES ke server webhook bot, lengkap dengan header secret token, lalu mencatat latensinya.
+# Contoh: python replay_updates.py updates.jsonl --concurrency 20
+# Catatan: bot akan benar-benar membalas ke chat yang ada di update rekaman.
+
+load_dotenv()
+
+# Fungsi untuk membaca update dari file JSONL
+def load_updates(path):
+    with open(path, 'r', encoding='utf-8') as record_file:
+        return [json.loads(line) for line in record_file if line.strip()]
+
+# Fungsi untuk mengirim satu update ke webhook dan mengembalikan status serta latensinya
+async def post_update(client, url, secret_token, update, semaphore):
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret_token} if secret_token else {}
+    async with semaphore:
+        start = time.perf_counter()
+        response = await client.post(url, json=update, headers=headers)
+        return response.status_code, time.perf_counter() - start
+
+async def main():
+    parser = argparse.ArgumentParser(description="Putar ulang update Telegram ke webhook lokal.")
+    parser.add_argument('file', help="File JSONL hasil RECORD_UPDATES")
+    parser.add_argument('--url', default=f"http://127.0.0.1:{os.getenv('WEBHOOK_PORT', '8443')}/{os.getenv('WEBHOOK_PATH', 'telegram')}")
+    parser.add_argument('--secret-token', default=os.getenv('WEBHOOK_SECRET_TOKEN'))
+    parser.add_argument('--concurrency', type=int, default=1, help="Jumlah update yang dikirim bersamaan")
+    parser.add_argument('--repeat', type=int, default=1, help="Ulangi seluruh rekaman beberapa kali")
+    args = parser.parse_args()
+
+    updates = load_updates(args.file) * args.repeat
+    if not updates:
+        print("Tidak ada update di file rekaman.")
+        return 1
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=30) as client:
+        results = await asyncio.gather(*(post_update(client, args.url, args.secret_token, update, semaphore) for update in updates))
+    total = time.perf_counter() - start
+
+    latencies = sorted(latency for _, latency in results)
+    failed = [status for status, _ in results if status != 200]
+    print(f"{len(results)} update dikirim dalam {total:.2f} detik, {len(failed)} gagal {sorted(set(failed)) if failed else ''}")
+    print(f"Latensi rata-rata {sum(latencies) / len(latencies) * 1000:.1f} ms, "
+          f"p95 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000:.1f} ms, "
+          f"maks {latencies[-1] * 1000:.1f} ms")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
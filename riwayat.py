@@ -0,0 +1,212 @@
+import os
+import math
+import sqlite3
+import threading
+import logging
+import numpy as np
+from kontak import NumberIndex, remove_duplicates_vcf, remove_duplicates_txt, remove_duplicates_xlsx
+
+# Modul ini menyimpan riwayat nomor yang sudah pernah diproses setiap pengguna, agar /convert dan
+# /hapus_duplikat bisa melewati nomor yang sudah dibagikan sebelumnya (aktifkan dengan /riwayat).
+# Setiap pengguna punya Bloom filter di disk untuk pengecekan cepat dan database SQLite sebagai data pasti:
+# nomor yang lolos Bloom filter (kemungkinan ada) dipastikan ke SQLite, yang tidak lolos pasti belum pernah ada.
+# Konfigurasi lewat .env:
+#   HISTORY_DIR            - folder penyimpanan riwayat (default data/riwayat)
+#   HISTORY_BLOOM_CAPACITY - perkiraan jumlah nomor per pengguna untuk ukuran Bloom filter (default 10000000)
+#   HISTORY_BLOOM_ERROR    - peluang positif palsu Bloom filter (default 0.01)
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DIR = os.getenv('HISTORY_DIR', os.path.join('data', 'riwayat'))
+HISTORY_BLOOM_CAPACITY = int(os.getenv('HISTORY_BLOOM_CAPACITY', '10000000'))
+HISTORY_BLOOM_ERROR = float(os.getenv('HISTORY_BLOOM_ERROR', '0.01'))
+
+# Batas jumlah parameter dalam satu query SQLite
+SQLITE_BATCH_SIZE = 500
+
+# Penulisan riwayat berjalan di pool thread, satu per satu agar bit Bloom filter tidak saling menimpa
+_write_lock = threading.Lock()
+
+# Fungsi hash splitmix64 untuk array uint64 (perkalian sengaja dibiarkan overflow)
+def _mix64(values):
+    with np.errstate(over='ignore'):
+        z = values + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+# Kelas Bloom filter yang disimpan sebagai file bit dan dibuka dengan memmap
+class BloomFilter:
+    def __init__(self, path, capacity, error_rate):
+        self.path = path
+        bit_count = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.size = (bit_count + 7) // 8
+        self.bit_count = self.size * 8
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        # File lama dengan ukuran berbeda (konfigurasi berubah) dibuat ulang dari SQLite
+        self.created = not os.path.exists(path) or os.path.getsize(path) != self.size
+        self.bits = np.memmap(path, dtype=np.uint8, mode='w+' if self.created else 'r+', shape=(self.size,))
+
+    def _positions(self, keys):
+        first = _mix64(np.asarray(keys, dtype=np.int64).astype(np.uint64))
+        second = _mix64(first) | np.uint64(1)
+        steps = np.arange(self.hash_count, dtype=np.uint64)[:, None]
+        with np.errstate(over='ignore'):
+            return (first + steps * second) % np.uint64(self.bit_count)
+
+    def contains(self, keys):
+        if len(keys) == 0:
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(keys)
+        hits = self.bits[positions >> np.uint64(3)] & (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8))
+        return np.all(hits != 0, axis=0)
+
+    def add(self, keys):
+        if len(keys) == 0:
+            return
+        positions = self._positions(keys).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8))
+
+    def clear(self):
+        self.bits[:] = 0
+
+    def flush(self):
+        self.bits.flush()
+
+# Kelas riwayat nomor satu pengguna. Nomor disimpan sebagai kunci int64 (lihat kontak.phone_number_key).
+class NumberHistory:
+    def __init__(self, user_id, directory=None):
+        directory = directory or HISTORY_DIR
+        os.makedirs(directory, exist_ok=True)
+        base_path = os.path.join(directory, str(user_id))
+        self.db = sqlite3.connect(base_path + '.sqlite')
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS numbers (key INTEGER PRIMARY KEY) WITHOUT ROWID')
+        self.bloom = BloomFilter(base_path + '.bloom', HISTORY_BLOOM_CAPACITY, HISTORY_BLOOM_ERROR)
+        if self.bloom.created:
+            self._rebuild_bloom()
+
+    def _rebuild_bloom(self):
+        cursor = self.db.execute('SELECT key FROM numbers')
+        while True:
+            rows = cursor.fetchmany(100000)
+            if not rows:
+                break
+            self.bloom.add(np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)))
+        self.bloom.flush()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM numbers').fetchone()[0]
+
+    # Fungsi untuk memeriksa banyak kunci sekaligus; hanya kunci yang lolos Bloom filter yang ditanyakan ke SQLite
+    def contains(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        found = (keys >= 0) & self.bloom.contains(keys)
+        candidates = np.flatnonzero(found)
+        if len(candidates) == 0:
+            return found
+        candidate_keys = keys[candidates].tolist()
+        existing = set()
+        for start in range(0, len(candidate_keys), SQLITE_BATCH_SIZE):
+            batch = candidate_keys[start:start + SQLITE_BATCH_SIZE]
+            query = f"SELECT key FROM numbers WHERE key IN ({','.join('?' * len(batch))})"
+            existing.update(row[0] for row in self.db.execute(query, batch))
+        found[candidates] = [key in existing for key in candidate_keys]
+        return found
+
+    # Fungsi untuk menambah kunci baru. Bloom filter ditulis dulu, jadi jika proses berhenti di tengah
+    # yang tersisa hanya positif palsu (dicek ulang ke SQLite), bukan nomor yang terlewat.
+    def add(self, keys):
+        keys = np.unique(np.asarray(keys, dtype=np.int64))
+        keys = keys[keys >= 0]
+        if len(keys) == 0:
+            return
+        self.bloom.add(keys)
+        self.bloom.flush()
+        with self.db:
+            self.db.executemany('INSERT OR IGNORE INTO numbers (key) VALUES (?)', ((key,) for key in keys.tolist()))
+
+    def clear(self):
+        with self.db:
+            self.db.execute('DELETE FROM numbers')
+        self.bloom.clear()
+        self.bloom.flush()
+
+    def close(self):
+        self.bloom.flush()
+        self.db.close()
+
+# Kelas indeks untuk dedup yang juga menganggap nomor di riwayat sebagai sudah ada.
+# Kunci baru hanya dicatat di memori (runs), riwayat baru ditulis lewat record_history setelah hasil terkirim.
+class HistoryIndex(NumberIndex):
+    def __init__(self, history):
+        super().__init__()
+        self.history = history
+
+    def contains(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        return super().contains(keys) | self.history.contains(keys)
+
+# Fungsi untuk menggabungkan kunci dari beberapa indeks menjadi satu array unik
+def _collect_keys(indexes):
+    runs = [run for index in indexes for run in index.runs]
+    return np.unique(np.concatenate(runs)) if runs else np.empty(0, dtype=np.int64)
+
+# Fungsi untuk membuang nomor yang sudah ada di riwayat pengguna dari beberapa ContactBatch
+# (hasil read_phone_numbers, None dibiarkan) dengan ContactBatch.difference. Nomor ganda di dalam unggahan
+# yang sama tidak diubah. Nomor lebih dari 17 angka tidak punya kunci, jadi tidak disaring dan tidak dicatat.
+# Mengembalikan (daftar batch yang sudah disaring, jumlah nomor yang dibuang, kunci nomor baru untuk record_history).
+def filter_known_numbers(user_id, batches):
+    history = NumberHistory(user_id)
+    try:
+        filtered = []
+        dropped = 0
+        new_keys = []
+        for batch in batches:
+            if batch is None:
+                filtered.append(None)
+                continue
+            fresh = batch.difference(history)
+            filtered.append(fresh)
+            dropped += len(batch) - len(fresh)
+            new_keys.append(fresh.keys[fresh.keys >= 0])
+        new_keys = np.unique(np.concatenate(new_keys)) if new_keys else np.empty(0, dtype=np.int64)
+        return filtered, dropped, new_keys
+    finally:
+        history.close()
+
+# Fungsi untuk menghapus duplikat sekaligus membuang nomor yang sudah ada di riwayat pengguna.
+# Jika global_mode, semua file memakai satu indeks (seperti remove_duplicates_global).
+# Mengembalikan (daftar (buffer atau None, jumlah duplikat), kunci nomor baru untuk record_history).
+def remove_duplicates_with_history(user_id, file_paths, global_mode=False):
+    engines = {'.vcf': remove_duplicates_vcf, '.txt': remove_duplicates_txt, '.xlsx': remove_duplicates_xlsx}
+    history = NumberHistory(user_id)
+    try:
+        indexes = [HistoryIndex(history)]
+        results = []
+        for file_path in file_paths:
+            if not global_mode and results:
+                indexes.append(HistoryIndex(history))
+            results.append(engines[os.path.splitext(file_path)[1]](file_path, indexes[-1]))
+        return results, _collect_keys(indexes)
+    finally:
+        history.close()
+
+# Fungsi untuk mencatat nomor baru ke riwayat pengguna setelah hasilnya terkirim
+def record_history(user_id, keys):
+    with _write_lock:
+        history = NumberHistory(user_id)
+        try:
+            history.add(keys)
+            logger.info(f"Recorded {len(keys)} numbers to history of user {user_id}.")
+        finally:
+            history.close()
+
+# Fungsi untuk menghapus seluruh riwayat pengguna
+def clear_history(user_id):
+    with _write_lock:
+        history = NumberHistory(user_id)
+        try:
+            history.clear()
+        finally:
+            history.close()